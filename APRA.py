@@ -3,185 +3,155 @@
 # Version: 1.2
 # Last Updated: 16-08-2023
 
+import time
+STARTED = time.perf_counter() # Start of the program, for --startup-time
+
+import os
 import sys
-import pandas as pd
-from PyQt5.QtWidgets import QApplication, QMainWindow, QPushButton, QVBoxLayout, QWidget, QTableWidget, QTableWidgetItem, QStackedWidget, QMessageBox, QFileDialog, QLabel
+import json
+import logging
+import argparse
+import threading
+import multiprocessing
 from datetime import datetime
+from PyQt5.QtCore import Qt, QThread, QTimer, QAbstractTableModel, QModelIndex, pyqtSignal
+from PyQt5.QtWidgets import QApplication, QMainWindow, QPushButton, QVBoxLayout, QHBoxLayout, QWidget, QTableWidget, QTableWidgetItem, QTableView, QStackedWidget, QMessageBox, QFileDialog, QLabel, QProgressBar
 
 
-def highlight_row(row):
-    """
-    Apply conditional formatting to a row based on specific criteria.
+PROFILE_ENV = "APRA_PROFILE" # Set to a folder to save the profile of every run there, see RunProfiler
+
+logger = logging.getLogger("APRA")
 
-    Parameters:
-        row (pd.Series): A row from the DataFrame.
+
+def pipeline():
+    """
+    The processing pipeline, imported on first use rather than at startup.
+    Importing it loads pandas, numpy, openpyxl and xlsxwriter, which take most of the startup time,
+    so the window is shown first and ReportGeneratorApp loads it in the background.
 
     Returns:
-        list: List of styles for each row in the dataframe.
+        module: apra_pipeline.
     """
 
-    # Convert "Invoice Date" to datetime and calculate the difference in days
-    inv_date = pd.to_datetime(row.loc["Invoice Date"], dayfirst=True)
-    diff = (pd.to_datetime(datetime.now().strftime("%d/%m/%Y"),dayfirst=True) - inv_date).days
-    
-    # Set background color based on conditions
-    if row.loc["IsCreditMemo"] == True:
-        color = "#ff91a4"  # Red color for credit memos
-    elif diff > 10:
-        color = "#ffffcc"  # Light yellow color for older invoices
-    else:
-        color = "#FFFFFF"  # White color for other rows
-    return [f'background-color: {color}' for r in row]
+    import apra_pipeline
+    return apra_pipeline
 
 
-def excel_to_dict(supp_df):
+class PipelineWorker(QThread):
+    """
+    Run a pipeline function on a background thread so the window keeps responding.
+    The function is called with progress and should_cancel keyword arguments, on top of its own.
     """
-    Convert Excel data to dictionaries for sorting process.
-    The excel file is must be 'Configuration.xlsx' and follow certain format.
-    Please find attached excel file.
 
-    Parameters:
-        supp_df (pd.DataFrame): Supplier DataFrame.
+    progress = pyqtSignal(str, int, int) # stage, done, total
+    succeeded = pyqtSignal(object) # return value of the function
+    failed = pyqtSignal(str) # error message
+    cancelled = pyqtSignal()
 
-    Returns:
-        tuple: Tuple containing lists of information for sorting.
-    """
+    def __init__(self, func, *args, parent=None, **kwargs):
+        """
+        Parameters:
+            func (callable): Pipeline function to run, such as read_inputs or main.
+            *args: Positional arguments for func.
+            parent (QObject, optional): Owner of the worker.
+            **kwargs: Keyword arguments for func.
+        """
 
-    supp_list = []
-    discriminant_list = []
-    special_list = []
+        super().__init__(parent)
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.cancel_event = threading.Event()
 
-    # Iterate through columns in the supplier DataFrame
-    for col in supp_df.columns:
-        key = col
-        values = list(supp_df[col].dropna())
-        discriminant_list.append(values)
-        supp_list.append(key)
-        if len(values[0]) > 1:
-            special_list.append(values[0])
 
-    return supp_list, discriminant_list, special_list
+    def cancel(self):
+        """
+        Ask the running function to stop at its next check.
+        """
 
+        self.cancel_event.set()
 
-def export_pages(sheet, page, entity, ind):
-    """
-    Export a DataFrame to an Excel file with customised formatting.
 
-    Parameters:
-        sheet (pd.DataFrame): Data to be exported.
-        page (str): Name of the Excel sheet.
-        entity (str): Entity information.
-        ind (int): Index for filename differentiation.
-    """
+    def run(self):
+        """
+        Run the function and report how it ended through the signals.
+        """
 
-    # Generate the file path for the Excel export
-    file_path = f"C:/Users/spark2/Desktop/SAP PO Upload/Python for PO/reports/{datetime.now().strftime('%d-%m-%Y')} {page} {entity} - {ind}.xlsx"
-    
-    # Create Excel writer with xlsxwriter engine
-    with pd.ExcelWriter(file_path, engine="xlsxwriter") as writer:
-        # Write DataFrame to the Excel sheet
-        sheet.to_excel(writer, sheet_name=page, index=False, float_format = "%.2f")
-        
-        # Get the workbook and worksheet objects
-        wb = writer.book
-        ws = writer.sheets[page]
-
-        # Iterate through columns to set column widths
-        text_wrap_format = wb.add_format({'text_wrap': True, "num_format":'0.00'})
-        num_format = wb.add_format({"num_format":'#.00'})
-        for column in sheet:
-            column_width = max(sheet[column].astype(str).map(len).max(), len(column))
-            col_idx = sheet.columns.get_loc(column)
-            ws.set_column(col_idx, col_idx, column_width + 1, num_format)
-        
-        # Apply text wrapping format to the "Comments" column
-        comments_col_idx = sheet.columns.get_loc("Comments")
-        ws.set_column(comments_col_idx, comments_col_idx, 35, text_wrap_format)
-        
-        # Apply conditional formatting using the highlight_row function
-        sheet = sheet.style.apply(highlight_row, axis=1)
-        sheet.to_excel(writer, sheet_name=page, index=False, float_format = "%.2f")
+        try:
+            result = self.func(*self.args, progress=self.progress.emit, should_cancel=self.cancel_event.is_set, **self.kwargs)
+        except pipeline().ProcessCancelled:
+            self.cancelled.emit()
+        except Exception as e:
+            self.failed.emit(str(e))
+        else:
+            self.succeeded.emit(result)
 
-def main(data_df, supp_df):
-    """
-    Main function to process and export data.
 
-    Parameters:
-        data_df (pd.DataFrame): Master data DataFrame.
-        supp_df (pd.DataFrame): Supplier data DataFrame.
+class DataFrameModel(QAbstractTableModel):
+    """
+    Read-only table model over the columns of a DataFrame.
+    Cells are formatted only when the view asks for them, so only the visible rows cost anything.
     """
 
-    # Get Supplier dictionary
-    supp_list, discriminant_list, special_list = excel_to_dict(supp_df)
-
-    # Clean the Master Data
-    try: # Incase they do not have following columns
-        data_df.drop(columns=["SC_Invoice_UniqueId"], inplace=True)
-    except:
-        skip
-    data_df = data_df.loc[data_df['Status'].isin(["Pending", "Approved"])]
-    data_df["Entity"].fillna("BLANK", inplace=True)
-
-    # Save column list for later reference
-    column_list = data_df.columns
-
-    # Get unique entities and create a dictionary for each entity's suppliers
-    entity_list = data_df['Entity'].unique()
-    entity_dict = {entity: {supp: [] for supp in supp_list} for entity in entity_list}
-
-    # Sort and group rows of data into appropriate pages
-    for ind,row in data_df.iterrows():
-        supp = row["Supplier Name"]
-        entity = row["Entity"]
-
-        if row["IsCreditMemo"]:
-            try: # Incase they do not have following columns
-                row["SubTotal"] *= -1
-                row["Tax"] *= -1
-                row["Total"] *= -1
-            except:
-                skip
-
-        if supp in special_list:
-            location = discriminant_list.index([supp])
-            entity_dict[entity][supp_list[location]].append(row)
-        else:
-            ind = 0
-            skip = 0
-            while skip == 0:
-                if supp[0].upper() in discriminant_list[ind]:
-                    entity_dict[entity][supp_list[ind]].append(row)
-                    skip = 1
-                ind += 1
-
-    count_dict = {supp: 0 for supp in supp_list}
-
-    # Export data for each entity/supplier
-    for entity in entity_list:
-        if len(entity_dict[entity]) != 0:
-            for page in supp_list:
-                count_dict[page] += len(entity_dict[entity][page])
-                if len(entity_dict[entity][page]) > 1:
-                    ind = 1
-                    sheet = pd.DataFrame(entity_dict[entity][page])
-                    #sheet.drop(columns=sheet.columns[0], axis=1, inplace=True)
-                    sheet.columns = column_list
-                    sheet.sort_values(by=["Supplier Name", "Invoice Date", "PO #"], inplace=True)
-                    sheet["Invoice Date"] = sheet["Invoice Date"].dt.strftime("%d/%m/%Y")
-                    sheet["ReceivedDate"] = sheet["ReceivedDate"].dt.strftime("%d/%m/%Y")
-                    if len(sheet) < 50:
-                        export_pages(sheet, page, entity, ind)
-                    else:
-                        while len(sheet) >= 50:
-                            sheet1 = sheet.iloc[:50]
-                            export_pages(sheet1, page, entity, ind)
-                            sheet = sheet.iloc[50:]
-                            ind += 1
-                        if len(sheet) != 0:
-                            export_pages(sheet, page, entity, ind)
-    
-    count_df = pd.DataFrame.from_dict(count_dict,columns=["NO. PO Lines"], orient='index')
-    count_df.T.to_excel("C:/Users/spark2/Desktop/SAP PO Upload/Python for PO/reports\Supplier Statistic.xlsx")
+    def __init__(self, data, parent=None):
+        """
+        Parameters:
+            data (pd.DataFrame): Data to be displayed.
+            parent (QObject, optional): Owner of the model.
+        """
+
+        super().__init__(parent)
+        self.headers = [str(column) for column in data.columns]
+        self.columns = [data.iloc[:, col].array for col in range(len(data.columns))]
+        self.row_count = len(data)
+
+
+    def rowCount(self, parent=QModelIndex()):
+        """
+        Returns:
+            int: Number of rows in the data.
+        """
+
+        return 0 if parent.isValid() else self.row_count
+
+
+    def columnCount(self, parent=QModelIndex()):
+        """
+        Returns:
+            int: Number of columns in the data.
+        """
+
+        return 0 if parent.isValid() else len(self.columns)
+
+
+    def data(self, index, role=Qt.DisplayRole):
+        """
+        Format a single cell for display.
+
+        Args:
+            index (QModelIndex): Position of the cell.
+            role (int): Requested Qt item role.
+
+        Returns:
+            str: Text of the cell, or None for roles other than display.
+        """
+
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+        return str(self.columns[index.column()][index.row()])
+
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        """
+        Returns:
+            str: Column name, or row number for the vertical header.
+        """
+
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self.headers[section]
+        return str(section + 1)
 
 
 class ReportGeneratorApp(QMainWindow):
@@ -189,13 +159,20 @@ class ReportGeneratorApp(QMainWindow):
     GUI application for importing, processing, and generating reports from Excel data.
     """
 
-    def __init__(self):
+    def __init__(self, startup_log=None):
         """
         Initialise the
         main application window and user interface.
+
+        Args:
+            startup_log (str, optional): File to add the startup times to before quitting, see record_startup.
         """
 
         super().__init__()
+        self.startup_log = startup_log
+        self.first_paint = None # Seconds from the start of the program to the first paint of the window
+        self.pipeline_loader = threading.Thread(target=self.load_pipeline, name="pipeline-loader", daemon=True)
+        self.pipeline_loaded = None # Seconds from the start of the program until the pipeline was imported
         self.init_ui()
 
 
@@ -205,7 +182,10 @@ class ReportGeneratorApp(QMainWindow):
         """
 
         self.setWindowTitle('AP Report Automation')
-        self.file_path = 0 # This will tell if user is drag and drop or import data from selection.
+        self.file_paths = [] # Exports to import, from drag and drop or the file selection. Empty until the user picks some.
+        self.import_cache = None # Files imported before are loaded from here instead of being parsed again, created on the first import
+        self.config_paths = [] # Configuration workbooks of the last import, see configuration_paths
+        self.configurations = [] # Name, RoutingIndex and HighlightRules of every configuration, set once imported
 
         # Create widgets
         self.import_button = QPushButton('Import Data OR Drag and Drop', self)
@@ -219,8 +199,8 @@ class ReportGeneratorApp(QMainWindow):
         font.setBold(True)    # Set the font to bold
         self.import_button.setFont(font)
 
-        # Create a table widget for data preview
-        self.data_preview_table = QTableWidget(self)
+        # Create a table view for data preview
+        self.data_preview_table = QTableView(self)
 
         self.header_preview_label = QLabel('Header Preview:', self)
         self.header_preview_label.setFont(font)
@@ -234,13 +214,29 @@ class ReportGeneratorApp(QMainWindow):
         self.path_label.setFont(info_font)
 
         self.default_button = QPushButton('Process', self)
-        self.default_button.clicked.connect(lambda: main(self.data, self.supp_df))
-        self.default_button.clicked.connect(self.show_done_message)
+        self.default_button.clicked.connect(self.process_data)
         self.default_button.setMinimumHeight(60)  # Set the minimum height to 60 (adjust as needed)
         self.default_button.setMinimumWidth(200)
         self.default_button.setFont(font)
         self.default_button.setEnabled(False)
 
+        # Progress of the background import or processing, with a button to cancel it
+        self.worker = None
+        self.ready_to_process = False # Set once imported data can be processed
+        self.profiler = None # Profile of the current run, set on import, see PROFILE_ENV
+        self.progress_bar = QProgressBar(self)
+        self.progress_bar.setTextVisible(True)
+        self.progress_bar.setFormat('Ready')
+        self.progress_bar.setValue(0)
+
+        self.cancel_button = QPushButton('Cancel', self)
+        self.cancel_button.clicked.connect(self.cancel_work)
+        self.cancel_button.setEnabled(False)
+
+        progress_layout = QHBoxLayout()
+        progress_layout.addWidget(self.progress_bar)
+        progress_layout.addWidget(self.cancel_button)
+
         self.setAcceptDrops(True)  # Enable drag and drop
 
         # Main layout
@@ -250,6 +246,7 @@ class ReportGeneratorApp(QMainWindow):
         main_layout.addWidget(self.header_preview_label)
         main_layout.addWidget(self.header_preview_table)
         main_layout.addWidget(self.path_label)
+        main_layout.addLayout(progress_layout)
         main_layout.addWidget(self.default_button)  # Align the button at the bottom
 
         self.main_widget = QWidget()
@@ -263,39 +260,228 @@ class ReportGeneratorApp(QMainWindow):
         self.setCentralWidget(self.stacked_widget)
 
 
+    def paintEvent(self, event):
+        """
+        Start loading the pipeline in the background once the window has been painted for the first time.
+        """
+
+        super().paintEvent(event)
+        if self.first_paint is None:
+            self.first_paint = time.perf_counter() - STARTED
+            self.pipeline_loader.start()
+            if self.startup_log is not None:
+                QTimer.singleShot(0, self.record_startup)
+
+
+    def load_pipeline(self):
+        """
+        Import the pipeline on a background thread, so it is usually loaded before the first import is started.
+        """
+
+        pipeline()
+        self.pipeline_loaded = time.perf_counter() - STARTED
+
+
+    def record_startup(self):
+        """
+        Startup measurement mode: wait for the pipeline to load, add the startup times to startup_log as a line of JSON and quit.
+        """
+
+        self.pipeline_loader.join()
+        record = {"started": datetime.now().isoformat(timespec="seconds"), "first_paint": round(self.first_paint, 3),
+                  "pipeline_loaded": round(self.pipeline_loaded, 3), "frozen": getattr(sys, "frozen", False)}
+        try:
+            with open(self.startup_log, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+        except OSError as e:
+            logger.warning("Could not save the startup times: %s", e)
+        QApplication.quit()
+
+
     def import_data(self):
         """
         Handle data import from Excel files and display data previews.
+        Several exports are merged into one set of reports, invoices in more than one of them are taken from the newest.
+        Configuration.xlsx is read with the configurations of other AP teams in the Configurations folder, see configuration_paths.
         """
 
         # Open a file dialog to allow the user to select an Excel file for import
         file_dialog = QFileDialog()
 
-        # If no file has been selected previously, set the file_path to the selected file's path
-        if self.file_path == 0:
-            self.file_path, _ = file_dialog.getOpenFileName(self, 'Open Excel File', '', 'Excel Files (*.xlsx);;All Files (*)')
+        # If no file has been selected previously, set the file_paths to the selected files' paths
+        if not self.file_paths:
+            self.file_paths, _ = file_dialog.getOpenFileNames(self, 'Open Excel Files', '', 'Excel Files (*.xlsx);;All Files (*)')
+
+        if self.file_paths and not self.is_busy():
+            self.ready_to_process = False
+            apra_pipeline = pipeline() # Waits for the background load if it has not finished yet
+            if self.import_cache is None:
+                self.import_cache = apra_pipeline.ImportCache()
+
+            # Read the Excel data and the configuration on a background thread, starting a new profile if profiling
+            self.profiler = apra_pipeline.RunProfiler(cprofile=True) if os.environ.get(PROFILE_ENV) else apra_pipeline.NO_PROFILER
+            # Oldest export first, so an invoice found in several exports is taken from the newest
+            file_paths = sorted(self.file_paths, key=os.path.getmtime)
+            self.config_paths = apra_pipeline.configuration_paths()
+            self.start_worker(PipelineWorker(apra_pipeline.read_inputs, file_paths, self.config_paths, self.import_cache, parent=self, profiler=self.profiler),
+                              self.on_import_done, "Import Error", "An error occurred while importing the Excel file")
+
+
+    def on_import_done(self, result):
+        """
+        Display data previews once the background import has finished.
+
+        Args:
+            result (tuple): Master data DataFrame, RoutingIndex and HighlightRules of every configuration returned by read_inputs.
+        """
+
+        apra_pipeline = pipeline()
+        self.data, routings, highlights = result
+        self.configurations = list(zip(map(apra_pipeline.configuration_name, self.config_paths), routings, highlights))
+
+        # Display import success message
+        self.show_import_message()
+
+        # Display data preview
+        self.display_data_preview(self.data)
+
+        # Display header preview, the pages of every configuration
+        self.display_header_preview(list(dict.fromkeys(page for _, routing, _ in self.configurations for page in routing.pages)))
+
+        # Report suppliers without a page now rather than halfway through processing
+        suppliers = self.data.loc[self.data["Status"].isin(apra_pipeline.REPORT_STATUSES), "Supplier Name"]
+        for name, routing, _ in self.configurations:
+            unrouted = routing.unroutable(suppliers)
+            if len(unrouted) != 0:
+                supplier_lines = "\n".join(map(str, unrouted))
+                error_message = f"No page in {name}.xlsx for supplier(s):\n{supplier_lines}\n\nAdd them to {name}.xlsx and import the data again."
+                self.show_error_message("Configuration Error", error_message)
+                return
+
+        # Enable Continue button
+        self.ready_to_process = True
+        self.default_button.setEnabled(not self.is_busy())
+
+
+    def process_data(self):
+        """
+        Process the imported data and generate the reports on a background thread.
+        With other configurations, the reports of each of them are saved in a sub-folder of the reports folder named after it.
+        """
+
+        if not self.is_busy():
+            # Reports are written to a local staging folder and copied to the shared reports folder in the background
+            apra_pipeline = pipeline()
+            if len(self.configurations) == 1:
+                _, routing, highlight = self.configurations[0]
+                worker = PipelineWorker(apra_pipeline.main, self.data, routing, highlight, parent=self, profiler=self.profiler, incremental=True,
+                                        staging_dir=apra_pipeline.staging_dir_for(apra_pipeline.REPORT_DIR))
+            else:
+                worker = PipelineWorker(apra_pipeline.run_configurations, self.data, self.configurations, apra_pipeline.REPORT_DIR, parent=self,
+                                        staging=True, profiler=self.profiler, incremental=True)
+            self.start_worker(worker, lambda result: self.show_done_message(), "Process Error", "An error occurred while generating the reports")
+
+
+    def is_busy(self):
+        """
+        Returns:
+            bool: True while an import or processing worker is running.
+        """
+
+        return self.worker is not None and self.worker.isRunning()
+
+
+    def start_worker(self, worker, on_success, error_title, error_text):
+        """
+        Start a background worker, locking the buttons and following its progress until it ends.
 
-        if self.file_path:
-            try:
-                # Read the Excel data and supplier data from the selected file and "List Example.xlsx"
-                self.data = pd.read_excel(self.file_path)
-                self.supp_df=pd.read_excel("Configuration.xlsx")
+        Args:
+            worker (PipelineWorker): Worker to start.
+            on_success (callable): Called with the worker's result once it succeeded.
+            error_title (str): Title of the message box shown if the worker fails.
+            error_text (str): Text shown above the error if the worker fails.
+        """
 
-                # Display import success message
-                self.show_import_message()
+        self.worker = worker
+        worker.progress.connect(self.update_progress)
+        worker.succeeded.connect(lambda result: self.end_progress('Done', 1))
+        worker.succeeded.connect(on_success)
+        worker.failed.connect(lambda error: self.end_progress('Failed', 0))
+        worker.failed.connect(lambda error: self.show_error_message(error_title, f"{error_text}:\n{error}"))
+        worker.cancelled.connect(lambda: self.end_progress('Cancelled', 0))
+        worker.finished.connect(self.on_worker_finished)
 
-                # Display data preview
-                self.display_data_preview(self.data.head(10))
+        self.import_button.setEnabled(False)
+        self.default_button.setEnabled(False)
+        self.cancel_button.setEnabled(True)
+        worker.start()
 
-                # Display header preview
-                self.display_header_preview(self.supp_df.columns)
 
-                # Enable Continue button
-                self.default_button.setEnabled(True)
+    def on_worker_finished(self):
+        """
+        Unlock the buttons once a background worker has ended, however it ended.
+        """
+
+        self.import_button.setEnabled(True)
+        self.default_button.setEnabled(self.ready_to_process)
+        self.cancel_button.setEnabled(False)
+        self.save_profile()
 
-            except Exception as e:
-                error_message = f"An error occurred while importing the Excel file:\n{str(e)}"
-                self.show_error_message("Import Error", error_message)
+
+    def save_profile(self):
+        """
+        Save the profile of the current run when profiling, updated after importing and again after processing.
+        """
+
+        if self.profiler is None or not self.profiler.enabled:
+            return
+        profile_dir = os.environ[PROFILE_ENV]
+        try:
+            os.makedirs(profile_dir, exist_ok=True)
+            self.profiler.save(os.path.join(profile_dir, f"profile-{self.profiler.started:%Y%m%d-%H%M%S}.json"))
+        except OSError as e:
+            logger.warning("Could not save the profile: %s", e)
+
+
+    def update_progress(self, stage, done, total):
+        """
+        Show the progress reported by a background worker.
+
+        Args:
+            stage (str): Name of the current stage.
+            done (int): Number of finished steps in the stage.
+            total (int): Number of steps in the stage, 0 when unknown.
+        """
+
+        # A range of (0, 0) shows a busy indicator for stages without a known length
+        self.progress_bar.setRange(0, total)
+        self.progress_bar.setValue(done)
+        self.progress_bar.setFormat(f"{stage} %v/%m" if total else stage)
+
+
+    def end_progress(self, text, value):
+        """
+        Stop the progress bar and show how the background work ended.
+
+        Args:
+            text (str): Text shown in the progress bar.
+            value (int): 1 for a full bar, 0 for an empty bar.
+        """
+
+        self.progress_bar.setRange(0, 1)
+        self.progress_bar.setValue(value)
+        self.progress_bar.setFormat(text)
+
+
+    def cancel_work(self):
+        """
+        Ask the running worker to stop. Reports already written are kept.
+        """
+
+        if self.is_busy():
+            self.worker.cancel()
+            self.cancel_button.setEnabled(False)
+            self.progress_bar.setFormat('Cancelling...')
 
 
     def display_header_preview(self, headers):
@@ -329,20 +515,11 @@ class ReportGeneratorApp(QMainWindow):
             data (pandas.DataFrame): Imported data to be displayed.
         """
 
-        # Clear previous data from the table
-        self.data_preview_table.clear()
-        self.data_preview_table.setRowCount(0)
-        self.data_preview_table.setColumnCount(0)
-
-        # Display data in the table widget
-        self.data_preview_table.setColumnCount(len(data.columns))
-        self.data_preview_table.setRowCount(len(data))
-        self.data_preview_table.setHorizontalHeaderLabels(data.columns)
-
-        for row in range(len(data)):
-            for col in range(len(data.columns)):
-                item = QTableWidgetItem(str(data.iloc[row, col]))
-                self.data_preview_table.setItem(row, col, item)
+        # Replace the model, the view only formats the rows that are on screen
+        old_model = self.data_preview_table.model()
+        self.data_preview_table.setModel(DataFrameModel(data, self.data_preview_table))
+        if old_model is not None:
+            old_model.deleteLater()
 
 
     def show_import_message(self):
@@ -354,7 +531,8 @@ class ReportGeneratorApp(QMainWindow):
         msg_box = QMessageBox(self)
         msg_box.setWindowTitle('Import Successful')
         msg_box.setIcon(QMessageBox.Information)
-        msg_box.setText(f'Data imported from:\n{self.file_path}')
+        file_lines = "\n".join(self.file_paths)
+        msg_box.setText(f'Data imported from:\n{file_lines}')
         msg_box.exec_()
 
 
@@ -393,8 +571,8 @@ class ReportGeneratorApp(QMainWindow):
             event (QDragEnterEvent): Drag-and-drop event object.
         """
 
-        # Accept drag-and-drop events if a valid .xlsx file is being dragged
-        if event.mimeData().hasUrls() and event.mimeData().urls()[0].toString().endswith(".xlsx"):
+        # Accept drag-and-drop events if valid .xlsx files are being dragged
+        if event.mimeData().hasUrls() and any(url.toString().endswith(".xlsx") for url in event.mimeData().urls()):
             event.acceptProposedAction()
 
 
@@ -406,9 +584,10 @@ class ReportGeneratorApp(QMainWindow):
             event (QDropEvent): Drop event object.
         """
 
-        # Handle a drop event when a valid .xlsx file is dropped
-        self.file_path = event.mimeData().urls()[0].toLocalFile()
-        self.import_data()
+        # Handle a drop event when valid .xlsx files are dropped, unless an import or processing is running
+        if not self.is_busy():
+            self.file_paths = [url.toLocalFile() for url in event.mimeData().urls() if url.toString().endswith(".xlsx")]
+            self.import_data()
 
 
 if __name__ == '__main__':
@@ -416,8 +595,13 @@ if __name__ == '__main__':
     Entry point of the application. Creates the main application window and starts the event loop.
     """
     
-    app = QApplication(sys.argv)
-    window = ReportGeneratorApp()
+    multiprocessing.freeze_support() # Lets the worker processes of the exe start
+    parser = argparse.ArgumentParser(prog="APRA", description="AP Reports Automation Program")
+    parser.add_argument("--startup-time", metavar="FILE", help="Add the time to the first paint and to the pipeline being loaded to FILE as a line of JSON, then quit")
+    args, qt_args = parser.parse_known_args()
+
+    app = QApplication(sys.argv[:1] + qt_args)
+    window = ReportGeneratorApp(args.startup_time)
     window.setGeometry(100, 100, 800, 600)
     window.show()
     sys.exit(app.exec_())
@@ -0,0 +1,242 @@
+# Headless command-line entry point of the AP Reports Automation Program, for scheduled and batch runs without the GUI.
+# Usage: python -m apra_cli EXPORT.xlsx [EXPORT.xlsx ...] --output REPORTS_FOLDER [--config Configuration.xlsx ...]
+#
+# Exit codes:
+#   0    every export was processed
+#   1    unexpected error
+#   2    invalid command-line arguments
+#   3    an export or the configuration could not be read
+#   4    the data or the configuration is not valid, such as a supplier without a page
+#   5    one or more reports could not be written
+#        With several exports, the exit code is 1 if any of them failed unexpectedly, otherwise the highest one
+#   130  interrupted with Ctrl+C
+
+import sys
+import os
+import zipfile
+import sqlite3
+import logging
+import argparse
+import multiprocessing
+from openpyxl.utils.exceptions import InvalidFileException
+from apra_pipeline import (OUTPUT_MODES, STATISTICS_FORMATS, PAGE_SIZE, ExportError, ImportCache, RunProfiler, NO_PROFILER, read_inputs, staging_dir_for,
+                           configuration_name, main, run_configurations)
+from apra_store import STORE_PATH, InvoiceStore
+
+
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_USAGE = 2
+EXIT_READ_ERROR = 3
+EXIT_INVALID = 4
+EXIT_WRITE_ERROR = 5
+EXIT_INTERRUPTED = 130
+
+logger = logging.getLogger("apra_cli")
+
+
+def parse_args(argv=None):
+    """
+    Parse the command-line arguments.
+
+    Parameters:
+        argv (list of str, optional): Arguments without the program name, sys.argv if not given.
+
+    Returns:
+        argparse.Namespace: Parsed arguments.
+    """
+
+    parser = argparse.ArgumentParser(prog="apra_cli", description="Generate the AP reports from SpendConsole exports without the GUI.")
+    parser.add_argument("inputs", nargs="+", metavar="EXPORT", help="SpendConsole export (.xlsx) to process")
+    parser.add_argument("-o", "--output", required=True, help="Folder the reports are saved in. With several exports, each one gets a sub-folder named after its file unless --merge is given.")
+    parser.add_argument("-c", "--config", action="append", default=None,
+                        help="Configuration workbook (default: Configuration.xlsx). Give it again for other configurations, the exports are then read once "
+                             "and the reports of every configuration after the first are saved in a sub-folder named after its workbook.")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Number of processes writing workbooks (default: number of CPUs)")
+    parser.add_argument("-m", "--mode", choices=OUTPUT_MODES, default="file",
+                        help="file: a workbook per page of 50 lines, entity: a workbook per entity, run: a single workbook, the last two with a sheet per page (default: file)")
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE, help=f"Maximum number of invoice lines in one sheet (default: {PAGE_SIZE})")
+    parser.add_argument("--statistics", choices=STATISTICS_FORMATS, default="xlsx",
+                        help="File type of Supplier Statistic, the CSV file only holds the summary per entity and page (default: xlsx)")
+    parser.add_argument("--merge", action="store_true",
+                        help="Read the exports at the same time and make one set of reports from them, invoices in more than one export are taken from the last")
+    parser.add_argument("--incremental", action="store_true", help="Only rewrite the reports which changed since the previous run of the day into the same folder")
+    parser.add_argument("--staging", action="store_true",
+                        help="Write the reports to a local staging folder first and copy them to the output folder in the background, for network shares")
+    parser.add_argument("--zip", action="store_true", help="With --staging, send the reports to the output folder as one zip file")
+    parser.add_argument("--store", nargs="?", const=STORE_PATH, default=None, metavar="DATABASE",
+                        help=f"Upsert the exports into a SQLite invoice store and report from it (default database: {STORE_PATH})")
+    parser.add_argument("--only-new", action="store_true", help="With --store, only report the invoices which are new since the previous import")
+    parser.add_argument("--no-cache", action="store_true", help="Always parse the exports instead of loading them from the import cache")
+    parser.add_argument("--profile", action="store_true", help="Save the time, rows and peak memory of every stage as profile.json in the output folder")
+    parser.add_argument("--cprofile", action="store_true", help="Also save cProfile statistics as profile.prof, implies --profile")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Only log warnings and errors")
+
+    args = parser.parse_args(argv)
+    if args.workers is not None and args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.page_size < 1:
+        parser.error("--page-size must be at least 1")
+    if args.only_new and not args.store:
+        parser.error("--only-new needs --store")
+    if args.zip and not args.staging:
+        parser.error("--zip needs --staging")
+    args.config = args.config or ["Configuration.xlsx"]
+    if len(set(map(configuration_name, args.config))) != len(args.config):
+        parser.error("--config workbooks must have different file names")
+    return args
+
+
+def log_progress(stage, done, total):
+    """
+    Progress callback which logs the start and the end of every stage.
+    """
+
+    if total == 0:
+        logger.info(stage)
+    elif done == 0 or done == total:
+        logger.info("%s %d/%d", stage, done, total)
+
+
+def combine_status(status, code):
+    """
+    Combine the exit codes of two exports, an unexpected error taking precedence over the known failures.
+
+    Parameters:
+        status (int): Exit code of the exports processed so far.
+        code (int): Exit code of the next export.
+
+    Returns:
+        int: Exit code of all of them.
+    """
+
+    if EXIT_ERROR in (status, code):
+        return EXIT_ERROR
+    return max(status, code)
+
+
+def process_file(file_path, config_path, output_dir, workers=None, cache=None, profile=False, cprofile=False, output_mode="file", incremental=False,
+                 store=None, only_new=False, staging=False, archive=False, page_size=PAGE_SIZE, statistics="xlsx"):
+    """
+    Generate the reports of one SpendConsole export, or of several merged into one.
+
+    Parameters:
+        file_path (str or list of str): Path of the SpendConsole export, see read_inputs for several.
+        config_path (str or list of str): Path of the configuration workbook. With several, the reports of every configuration
+            after the first are saved in a sub-folder of output_dir named after it, see run_configurations.
+        output_dir (str): Folder the reports are saved in, created if missing.
+        workers (int, optional): Number of processes writing workbooks.
+        cache (ImportCache, optional): Cache of previous imports.
+        profile (bool): Save the stages of the run as profile.json in output_dir, failed runs included.
+        cprofile (bool): With profile, also save cProfile statistics as profile.prof.
+        output_mode (str): How the pages are gathered into workbooks, one of OUTPUT_MODES.
+        incremental (bool): Only rewrite the workbooks which changed since the previous run of the day.
+        store (InvoiceStore, optional): Invoice store the export is upserted into and reported from.
+        only_new (bool): With a store, only report the invoices which are new since the previous import.
+        staging (bool): Write the reports to a local staging folder first, then copy them to output_dir in the background.
+        archive (bool): With staging, send the reports to output_dir as one zip file.
+        page_size (int): Maximum number of invoice lines in one sheet.
+        statistics (str): File type of Supplier Statistic, one of STATISTICS_FORMATS.
+
+    Returns:
+        int: Exit code of the export.
+    """
+
+    file_name = file_path if isinstance(file_path, str) else ", ".join(file_path)
+    logger.info("Processing %s", file_name)
+    profiler = RunProfiler(cprofile=cprofile) if profile else NO_PROFILER
+    reading = True
+    try:
+        data_df, routing, highlight = read_inputs(file_path, config_path, cache, progress=log_progress, profiler=profiler, store=store, only_new=only_new,
+                                                  workers=workers)
+        reading = False
+        os.makedirs(output_dir, exist_ok=True)
+        if isinstance(config_path, str):
+            main(data_df, routing, highlight, workers, output_dir, progress=log_progress, profiler=profiler, output_mode=output_mode, incremental=incremental,
+                 staging_dir=staging_dir_for(output_dir) if staging else None, archive=archive, page_size=page_size,
+                 statistics=statistics)
+        else:
+            run_configurations(data_df, list(zip(map(configuration_name, config_path), routing, highlight)), output_dir, staging, profiler,
+                               workers=workers, progress=log_progress, output_mode=output_mode, incremental=incremental, archive=archive,
+                               page_size=page_size, statistics=statistics)
+    except (OSError, sqlite3.Error, zipfile.BadZipFile, InvalidFileException) as e:
+        if reading:
+            logger.error("Could not read the files of %s: %s", file_name, e)
+            return EXIT_READ_ERROR
+        logger.error("Could not write the reports of %s to %s: %s", file_name, output_dir, e)
+        return EXIT_WRITE_ERROR
+    except ExportError as e:
+        logger.error("%s", e)
+        return EXIT_WRITE_ERROR
+    except ValueError as e:
+        logger.error("Invalid data or configuration in %s: %s", file_name, e)
+        return EXIT_INVALID
+    except Exception:
+        logger.exception("Unexpected error while processing %s", file_name)
+        return EXIT_ERROR
+    finally:
+        save_profile(profiler, output_dir)
+
+    logger.info("Reports of %s saved in %s", file_name, output_dir)
+    return EXIT_OK
+
+
+def save_profile(profiler, output_dir):
+    """
+    Save the profile of a run in its output folder. A profile which cannot be saved does not fail the run.
+    """
+
+    if not profiler.enabled:
+        return
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+        profiler.save(os.path.join(output_dir, "profile.json"))
+        logger.info("Profile saved in %s", output_dir)
+    except OSError as e:
+        logger.warning("Could not save the profile: %s", e)
+
+
+def run(argv=None):
+    """
+    Process every export given on the command line. A failed export does not stop the others.
+
+    Parameters:
+        argv (list of str, optional): Arguments without the program name, sys.argv if not given.
+
+    Returns:
+        int: Highest exit code of the exports.
+    """
+
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING if args.quiet else logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    cache = None if args.no_cache else ImportCache()
+    try:
+        store = InvoiceStore(args.store) if args.store else None
+    except (OSError, sqlite3.Error) as e:
+        logger.error("Could not open the invoice store %s: %s", args.store, e)
+        return EXIT_READ_ERROR
+
+    status = EXIT_OK
+    inputs = [args.inputs] if args.merge else args.inputs
+    config_path = args.config[0] if len(args.config) == 1 else args.config
+    try:
+        for file_path in inputs:
+            output_dir = args.output
+            if len(inputs) > 1:
+                output_dir = os.path.join(args.output, os.path.splitext(os.path.basename(file_path))[0])
+            code = process_file(file_path, config_path, output_dir, args.workers, cache, args.profile or args.cprofile, args.cprofile, args.mode,
+                                args.incremental, store, args.only_new, args.staging, args.zip, args.page_size, args.statistics)
+            status = combine_status(status, code)
+    finally:
+        if store is not None:
+            store.close()
+
+    return status
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support() # Lets the worker processes of a frozen exe start
+    try:
+        sys.exit(run())
+    except KeyboardInterrupt:
+        sys.exit(EXIT_INTERRUPTED)
@@ -0,0 +1,1983 @@
+# Processing pipeline of the AP Reports Automation Program: reading SpendConsole exports, routing invoices to pages and writing the report workbooks.
+# It does not depend on Qt, so it can be run by the GUI in APRA.py or headless by apra_cli.py.
+
+import os
+import json
+import queue
+import shutil
+import zipfile
+import hashlib
+import time
+import logging
+import threading
+import cProfile
+import tracemalloc
+from contextlib import contextmanager
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+from pandas._libs.parsers import STR_NA_VALUES
+import openpyxl
+import xlsxwriter
+try: # Optional, imports are cached as Feather when pyarrow is installed and pickled otherwise
+    import pyarrow
+except ImportError:
+    pyarrow = None
+from datetime import datetime
+
+
+REPORT_STATUSES = ["Pending", "Approved"] # Only invoices in these statuses are reported
+ID_COLUMN = "SC_Invoice_UniqueId" # Unique id of an invoice in SpendConsole
+UNUSED_COLUMNS = [ID_COLUMN] # Master data columns which are not reported
+CATEGORY_COLUMNS = ["Entity", "Supplier Name", "Status", "IsCreditMemo"] # Columns full of repeated values
+DATE_COLUMNS = ["Invoice Date", "ReceivedDate"]
+AMOUNT_COLUMNS = ["SubTotal", "Tax", "Total"]
+DATE_FORMAT = "dd/mm/yyyy" # Excel number format of the DATE_COLUMNS cells
+AMOUNT_FORMAT = "0.00" # Excel number format of the AMOUNT_COLUMNS cells
+NA_STRINGS = frozenset(STR_NA_VALUES) # Text read as a blank cell, the default na_values of pd.read_excel
+IMPORT_CACHE_DIR = os.path.join(os.environ.get("LOCALAPPDATA", os.path.expanduser("~/.cache")), "APRA", "imports")
+IMPORT_CACHE_MAX_BYTES = 500 * 2**20 # Least recently used imports are removed above this size
+PAGE_SIZE = 50 # Maximum number of invoice lines in one report workbook
+CONFIG_DIR = "Configurations" # Folder next to Configuration.xlsx with the configurations of other AP teams, see configuration_paths
+STREAM_MIN_ROWS = 5000 # Workbooks with at least this many rows are streamed to disk in xlsxwriter constant_memory mode
+ROW_BLOCK = 1000 # Rows converted to cell values at a time while writing a worksheet
+# Worksheet._opt_close and _opt_reopen are private XlsxWriter methods, checked against the pinned XlsxWriter 3.1.2 (requirements.txt).
+# _opt_close closes the temporary file of a streamed worksheet, which XlsxWriter reopens with _opt_reopen when saving the workbook.
+# If an upgrade drops them, streamed worksheets keep their files open until the workbook is closed, as XlsxWriter does by default.
+CLOSE_STREAMED_SHEETS = all(hasattr(xlsxwriter.worksheet.Worksheet, name) for name in ("_opt_close", "_opt_reopen"))
+REPORT_DIR = "C:/Users/spark2/Desktop/SAP PO Upload/Python for PO/reports" # Folder the reports are saved in
+PARALLEL_MIN_JOBS = 10 # Below this many workbooks, starting worker processes costs more than it saves
+OUTPUT_MODES = ["file", "entity", "run"] # Report workbooks: one per sheet, one per entity or one per run
+STATISTICS_FORMATS = ["xlsx", "csv"] # Supplier Statistic file types
+AGEING_BUCKETS = [30, 60, 90] # Upper bounds in days of the invoice age columns of the statistics, older invoices go in a last column
+STAGING_DIR = os.path.join(os.environ.get("LOCALAPPDATA", os.path.expanduser("~/.cache")), "APRA", "staging") # Local folder reports are written to before being copied
+COPY_ATTEMPTS = 4 # Tries of every copy to the reports folder
+COPY_RETRY_DELAY = 1.0 # Seconds before the first retry of a copy, doubled for every further retry
+
+logger = logging.getLogger(__name__)
+
+
+class ProcessCancelled(Exception):
+    """
+    Raised when the user cancels importing or processing.
+    """
+
+
+class ExportError(Exception):
+    """
+    Raised when one or more report workbooks could not be written.
+    The other workbooks are still written, failures holds (file path, error) pairs.
+    """
+
+    def __init__(self, failures):
+        self.failures = failures
+        lines = "\n".join(f"{os.path.basename(file_path)}: {error}" for file_path, error in failures)
+        super().__init__(f"{len(failures)} report(s) could not be written:\n{lines}")
+
+
+def no_progress(stage, done, total):
+    """
+    Default progress callback which ignores every update.
+    """
+
+
+def never_cancel():
+    """
+    Default cancel callback which never asks to stop.
+    """
+
+    return False
+
+
+class RunProfiler:
+    """
+    Opt-in instrumentation of a run: wall time, row and workbook counts and peak memory of every stage.
+    Stages are logged as they finish and saved together as a JSON summary, with an optional cProfile dump,
+    so slow runs can be looked into afterwards. A disabled profiler records nothing and costs nothing.
+
+    Peak memory is traced with tracemalloc in this process only, so it leaves out the workbook writer processes.
+    Tracing slows down every allocation, so tracing started by the profiler is stopped once it is saved,
+    and started again by the next stage.
+    """
+
+    def __init__(self, enabled=True, trace_memory=True, cprofile=False):
+        """
+        Parameters:
+            enabled (bool): Record the stages.
+            trace_memory (bool): Trace the peak memory of every stage, which slows the run down.
+            cprofile (bool): Also profile every function call of the stages with cProfile.
+        """
+
+        self.enabled = enabled
+        self.trace_memory = enabled and trace_memory
+        self.profile = cProfile.Profile() if enabled and cprofile else None
+        self.started = datetime.now()
+        self.stages = []
+        self.labels = {} # Added to every stage recorded, such as the configuration being processed
+        self.tracing = False # Tracing was started by this profiler
+        self.start_tracing()
+
+
+    def start_tracing(self):
+        """
+        Start tracing memory if tracing peak memory and nothing else is tracing already.
+        """
+
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.tracing = True
+
+
+    def stop_tracing(self):
+        """
+        Stop tracing memory if this profiler started it, tracing started elsewhere is left alone.
+        """
+
+        if self.tracing:
+            tracemalloc.stop()
+            self.tracing = False
+
+
+    @contextmanager
+    def stage(self, name, **counts):
+        """
+        Record one stage of the run. Stages are not nested.
+
+        Parameters:
+            name (str): Name of the stage.
+            **counts: Counts known when the stage starts, such as rows.
+
+        Yields:
+            dict: Record of the stage, counts found during the stage can be added to it.
+        """
+
+        record = dict(stage=name, **self.labels, **counts)
+        if not self.enabled:
+            yield record
+            return
+
+        if self.trace_memory:
+            self.start_tracing()
+            tracemalloc.reset_peak()
+        if self.profile is not None:
+            self.profile.enable() # Enabled per stage, as import and processing run on different threads of the GUI
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["seconds"] = round(time.perf_counter() - start, 4)
+            if self.profile is not None:
+                self.profile.disable()
+            if self.trace_memory:
+                record["peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 1)
+            self.stages.append(record)
+            logger.info("Stage %s: %s", name, " ".join(f"{key}={value}" for key, value in record.items() if key != "stage"))
+
+
+    def summary(self):
+        """
+        Returns:
+            dict: Start time, total time, peak memory and records of every stage.
+        """
+
+        summary = {"started": self.started.isoformat(timespec="seconds"),
+                   "seconds": round(sum(record["seconds"] for record in self.stages), 4),
+                   "stages": self.stages}
+        if self.trace_memory:
+            summary["peak_mb"] = max((record["peak_mb"] for record in self.stages), default=0.0)
+        return summary
+
+
+    def save(self, json_path, cprofile_path=None):
+        """
+        Save the JSON summary, and the cProfile statistics if profiling (open with pstats or snakeviz).
+
+        Parameters:
+            json_path (str): Path of the JSON summary.
+            cprofile_path (str, optional): Path of the cProfile statistics, json_path with .prof if not given.
+        """
+
+        if not self.enabled:
+            return
+        self.stop_tracing()
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, indent=1)
+        if self.profile is not None:
+            self.profile.dump_stats(cprofile_path or os.path.splitext(json_path)[0] + ".prof")
+
+
+NO_PROFILER = RunProfiler(enabled=False) # Default of the pipeline functions, records nothing
+
+
+class HighlightRules:
+    """
+    Row highlight settings, read from the optional 'Settings' sheet of Configuration.xlsx.
+    The sheet has a 'Setting' and a 'Value' column, settings which are left out keep their default.
+    """
+
+    # Setting name in Configuration.xlsx and the matching attribute
+    SETTINGS = {"Ageing Days": "ageing_days", "Credit Memo Colour": "credit_colour",
+                "Older Invoice Colour": "older_colour", "Normal Colour": "normal_colour"}
+
+    def __init__(self, ageing_days=10, credit_colour="#ff91a4", older_colour="#ffffcc", normal_colour="#FFFFFF"):
+        """
+        Parameters:
+            ageing_days (int): Invoices older than this many days are highlighted.
+            credit_colour (str): Background colour of credit memos.
+            older_colour (str): Background colour of older invoices.
+            normal_colour (str): Background colour of other rows.
+        """
+
+        self.ageing_days = int(ageing_days)
+        self.credit_colour = str(credit_colour).strip()
+        self.older_colour = str(older_colour).strip()
+        self.normal_colour = str(normal_colour).strip()
+
+
+    @classmethod
+    def from_frame(cls, settings_df):
+        """
+        Read the rules from the 'Settings' sheet.
+
+        Parameters:
+            settings_df (pd.DataFrame): Settings DataFrame with 'Setting' and 'Value' columns.
+
+        Returns:
+            HighlightRules: Rules with the configured settings.
+        """
+
+        kwargs = {}
+        for name, value in zip(settings_df["Setting"], settings_df["Value"]):
+            if pd.isna(name) or pd.isna(value):
+                continue
+            if str(name).strip() not in cls.SETTINGS:
+                raise ValueError(f"Unknown setting in Configuration.xlsx: {name}")
+            kwargs[cls.SETTINGS[str(name).strip()]] = value
+
+        return cls(**kwargs)
+
+
+    def colours(self, data_df):
+        """
+        Work out the background colour of every row in one vectorised pass.
+
+        Parameters:
+            data_df (pd.DataFrame): Master data DataFrame with "Invoice Date" still as datetimes.
+
+        Returns:
+            np.ndarray: Background colour of each row.
+        """
+
+        # Age in whole days, the time of day is ignored as it is not shown in the reports
+        today = pd.Timestamp(datetime.now().date())
+        age = (today - data_df["Invoice Date"].dt.normalize()).dt.days
+
+        # Credit memos first, then older invoices, then the rest
+        return np.select(
+            [data_df["IsCreditMemo"] == True, age > self.ageing_days],
+            [self.credit_colour, self.older_colour],
+            default=self.normal_colour
+        )
+
+
+def load_highlight_rules(config_path="Configuration.xlsx"):
+    """
+    Load the highlight rules of a configuration workbook, see load_configuration for the cached ones.
+
+    Parameters:
+        config_path (str): Path of the configuration workbook.
+
+    Returns:
+        HighlightRules: Configured rules, or the defaults if the workbook has no 'Settings' sheet.
+    """
+
+    with pd.ExcelFile(config_path) as config:
+        if "Settings" not in config.sheet_names:
+            return HighlightRules()
+        return HighlightRules.from_frame(config.parse("Settings"))
+
+
+def excel_values(column):
+    """
+    Convert a column to the cell values pandas would write.
+    Missing values become blank cells and floats are rounded to 2 decimal places.
+
+    Parameters:
+        column (pd.Series): Column to be exported.
+
+    Returns:
+        list: Cell values.
+    """
+
+    values = column.astype(object).where(column.notna(), None).tolist()
+    for i, value in enumerate(values):
+        if isinstance(value, float):
+            values[i] = float("%.2f" % value) if math.isfinite(value) else str(value)
+    return values
+
+
+def excel_to_dict(supp_df):
+    """
+    Convert Excel data to dictionaries for sorting process.
+    The excel file is must be 'Configuration.xlsx' and follow certain format.
+    Please find attached excel file.
+
+    Parameters:
+        supp_df (pd.DataFrame): Supplier DataFrame.
+
+    Returns:
+        tuple: Tuple containing lists of information for sorting.
+    """
+
+    supp_list = []
+    discriminant_list = []
+    special_list = []
+
+    # Iterate through columns in the supplier DataFrame
+    for col in supp_df.columns:
+        key = col
+        values = list(supp_df[col].dropna())
+        discriminant_list.append(values)
+        supp_list.append(key)
+        if len(values[0]) > 1:
+            special_list.append(values[0])
+
+    return supp_list, discriminant_list, special_list
+
+
+def file_digest(file_path):
+    """
+    Calculate the SHA-256 hash of a file's content.
+
+    Parameters:
+        file_path (str): Path of the file.
+
+    Returns:
+        str: Hex digest of the file content.
+    """
+
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class RoutingIndex:
+    """
+    Compiled lookup tables that send each supplier to its report page.
+
+    Every value in a Configuration.xlsx column is read as one of
+        - a single letter: suppliers whose name starts with that letter,
+        - a name ending with '*': suppliers whose name starts with that prefix (not case sensitive),
+        - any other name: that exact supplier.
+    An exact name wins over a prefix, and the longest prefix wins over a letter.
+    When a name or letter is listed twice, the left-most page wins.
+    """
+
+    VERSION = 2 # Bump when the cached layout changes, see load_configuration
+
+    def __init__(self, pages, exact, letters, prefixes):
+        """
+        Parameters:
+            pages (list of str): Page names in configuration order.
+            exact (dict): Supplier name to page.
+            letters (dict): First letter to page.
+            prefixes (dict): Trie of upper case prefixes, the "" key of a node holds its page.
+        """
+
+        self.pages = pages
+        self.exact = exact
+        self.letters = letters
+        self.prefixes = prefixes
+
+
+    @classmethod
+    def from_frame(cls, supp_df):
+        """
+        Compile the index from the configuration DataFrame.
+
+        Parameters:
+            supp_df (pd.DataFrame): Supplier DataFrame.
+
+        Returns:
+            RoutingIndex: Compiled index.
+        """
+
+        supp_list, discriminant_list, _ = excel_to_dict(supp_df)
+        exact, letters, prefixes = {}, {}, {}
+
+        for page, values in zip(supp_list, discriminant_list):
+            for value in map(str, values):
+                if len(value) > 1 and value.endswith("*"):
+                    node = prefixes
+                    for char in value[:-1].upper():
+                        node = node.setdefault(char, {})
+                    node.setdefault("", page)
+                elif len(value) == 1:
+                    letters.setdefault(value, page)
+                else:
+                    exact.setdefault(value, page)
+
+        return cls(list(supp_list), exact, letters, prefixes)
+
+
+    def page_of(self, supplier):
+        """
+        Look up the page of a single supplier.
+
+        Parameters:
+            supplier (str): Supplier name.
+
+        Returns:
+            str: Page name, or None if no page is configured for the supplier.
+        """
+
+        if not isinstance(supplier, str) or supplier == "":
+            return None
+        if supplier in self.exact:
+            return self.exact[supplier]
+
+        # Walk the trie as far as the name allows, remembering the longest prefix with a page
+        page = None
+        node = self.prefixes
+        for char in supplier.upper():
+            node = node.get(char)
+            if node is None:
+                break
+            page = node.get("", page)
+
+        if page is None:
+            page = self.letters.get(supplier[0].upper())
+        return page
+
+
+    def route(self, suppliers):
+        """
+        Work out the page of every supplier, looking up each distinct name once.
+
+        Parameters:
+            suppliers (pd.Series): Supplier names.
+
+        Returns:
+            pd.Series: Page names aligned with suppliers, NaN where no page is configured.
+        """
+
+        # Factorising reuses the codes of categorical columns, then every row is a single array lookup
+        codes, uniques = pd.factorize(suppliers)
+        lookup = np.array([self.page_of(supplier) for supplier in uniques] + [None], dtype=object)
+        return pd.Series(lookup[codes], index=suppliers.index)
+
+
+    def unroutable(self, suppliers):
+        """
+        Find the suppliers which have no page in the configuration.
+
+        Parameters:
+            suppliers (pd.Series): Supplier names.
+
+        Returns:
+            list: Distinct supplier names without a page.
+        """
+
+        return [supplier for supplier in pd.unique(suppliers) if self.page_of(supplier) is None]
+
+
+    def to_dict(self):
+        """
+        Returns:
+            dict: JSON serialisable form of the index.
+        """
+
+        return {"version": self.VERSION, "pages": self.pages, "exact": self.exact,
+                "letters": self.letters, "prefixes": self.prefixes}
+
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Parameters:
+            data (dict): Output of to_dict.
+
+        Returns:
+            RoutingIndex: Restored index.
+        """
+
+        return cls(data["pages"], data["exact"], data["letters"], data["prefixes"])
+
+
+def load_configuration(config_path="Configuration.xlsx"):
+    """
+    Load the compiled routing index and the highlight rules of a configuration workbook.
+    Both are cached as JSON next to the workbook and reused until the workbook's
+    modified time changes and its content hash no longer matches the cached one.
+
+    Parameters:
+        config_path (str): Path of the configuration workbook.
+
+    Returns:
+        tuple: Compiled RoutingIndex and HighlightRules.
+    """
+
+    cache_path = os.path.splitext(config_path)[0] + ".routing.json"
+    stat = os.stat(config_path)
+
+    try:
+        with open(cache_path, encoding="utf-8") as f:
+            cached = json.load(f)
+        if cached.get("version") != RoutingIndex.VERSION:
+            cached = None
+    except (OSError, ValueError):
+        cached = None
+
+    # Unchanged modified time means unchanged workbook, otherwise fall back to the content hash
+    if cached is not None and cached["mtime"] == stat.st_mtime_ns and cached["size"] == stat.st_size:
+        return RoutingIndex.from_dict(cached), HighlightRules(**cached["highlight"])
+    digest = file_digest(config_path)
+    if cached is not None and cached["hash"] == digest:
+        index, highlight = RoutingIndex.from_dict(cached), HighlightRules(**cached["highlight"])
+    else:
+        with pd.ExcelFile(config_path) as config:
+            index = RoutingIndex.from_frame(config.parse(0))
+            highlight = HighlightRules.from_frame(config.parse("Settings")) if "Settings" in config.sheet_names else HighlightRules()
+
+    # Saving the cache is best effort, the exe folder may be read only
+    data = dict(index.to_dict(), highlight=vars(highlight), mtime=stat.st_mtime_ns, size=stat.st_size, hash=digest)
+    tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp" # Several exports may be processed at once
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass
+
+    return index, highlight
+
+
+def configuration_paths(config_path="Configuration.xlsx"):
+    """
+    Find the configuration workbooks: the main one and those of other AP teams with their own page split,
+    which are only used when saved in the CONFIG_DIR folder next to the main one, such as 'Configurations/Team B.xlsx'.
+
+    Parameters:
+        config_path (str): Path of the main configuration workbook.
+
+    Returns:
+        list of str: Paths of the workbooks, the main one first.
+    """
+
+    config_dir = os.path.join(os.path.dirname(config_path), CONFIG_DIR)
+    if not os.path.isdir(config_dir):
+        return [config_path]
+    names = sorted(name for name in os.listdir(config_dir) if name.lower().endswith(".xlsx") and not name.startswith("~$"))
+    return [config_path] + [os.path.join(config_dir, name) for name in names]
+
+
+def configuration_name(config_path):
+    """
+    Returns:
+        str: Name of a configuration, the file name of its workbook without the extension. The reports of
+            the configurations after the main one are saved in a folder of that name, see run_configurations.
+    """
+
+    return os.path.splitext(os.path.basename(config_path))[0]
+
+
+def report_path(page, entity, ind, run_date, output_dir=REPORT_DIR):
+    """
+    Generate the file path of a report workbook.
+
+    Parameters:
+        page (str): Name of the page.
+        entity (str): Entity information.
+        ind (int): Index for filename differentiation.
+        run_date (str): Date of the run, as dd-mm-yyyy.
+        output_dir (str): Folder the reports are saved in.
+
+    Returns:
+        str: Path of the workbook in output_dir.
+    """
+
+    return f"{output_dir}/{run_date} {page} {entity} - {ind}.xlsx"
+
+
+def entity_report_path(entity, run_date, output_dir=REPORT_DIR):
+    """
+    Generate the file path of the workbook holding every page of an entity, for the "entity" output mode.
+    """
+
+    return f"{output_dir}/{run_date} {entity}.xlsx"
+
+
+def run_report_path(run_date, output_dir=REPORT_DIR):
+    """
+    Generate the file path of the workbook holding every page of a run, for the "run" output mode.
+    """
+
+    return f"{output_dir}/{run_date} Reports.xlsx"
+
+
+def sheet_name(name, used):
+    """
+    Make a valid Excel sheet name which is not used yet in its workbook.
+
+    Parameters:
+        name (str): Wanted name.
+        used (set): Names already used in the workbook, the returned name is added to it.
+
+    Returns:
+        str: Name without the characters Excel does not allow, at most 31 characters long.
+    """
+
+    name = "".join("_" if char in "[]:*?/\\" else char for char in str(name)).strip("'")[:31] or "Sheet"
+    unique, ind = name, 1
+    while unique.lower() in used:
+        ind += 1
+        unique = f"{name[:31 - len(str(ind)) - 1]}~{ind}"
+    used.add(unique.lower())
+    return unique
+
+
+class ReportFormats:
+    """
+    Cell formats of a report workbook, created once and shared by all of its sheets.
+    """
+
+    def __init__(self, wb):
+        """
+        Parameters:
+            wb (xlsxwriter.Workbook): Workbook the formats belong to.
+        """
+
+        self.wb = wb
+        self.header = wb.add_format({"bold": True, "border": 1, "align": "center", "valign": "top"})
+        self.text_wrap = wb.add_format({'text_wrap': True, "num_format":'0.00'})
+        self.num = wb.add_format({"num_format":'#.00'})
+        self.rows = {}
+        self.datetimes = {}
+        self.dates = {}
+        self.amounts = {}
+
+
+    def row(self, colour):
+        """
+        Returns:
+            xlsxwriter.format.Format: Fill of a row highlighted in colour.
+        """
+
+        if colour not in self.rows:
+            self.rows[colour] = self.wb.add_format({"pattern": 1, "fg_color": colour})
+        return self.rows[colour]
+
+
+    def datetime(self, colour):
+        """
+        Returns:
+            xlsxwriter.format.Format: Fill of a row highlighted in colour, for datetime cells.
+        """
+
+        if colour not in self.datetimes:
+            self.datetimes[colour] = self.wb.add_format({"pattern": 1, "fg_color": colour, "num_format": "YYYY-MM-DD HH:MM:SS"})
+        return self.datetimes[colour]
+
+
+    def date(self, colour):
+        """
+        Returns:
+            xlsxwriter.format.Format: Fill of a row highlighted in colour, for the cells of DATE_COLUMNS.
+        """
+
+        if colour not in self.dates:
+            self.dates[colour] = self.wb.add_format({"pattern": 1, "fg_color": colour, "num_format": DATE_FORMAT})
+        return self.dates[colour]
+
+
+    def amount(self, colour):
+        """
+        Returns:
+            xlsxwriter.format.Format: Fill of a row highlighted in colour, for the cells of AMOUNT_COLUMNS.
+        """
+
+        if colour not in self.amounts:
+            self.amounts[colour] = self.wb.add_format({"pattern": 1, "fg_color": colour, "num_format": AMOUNT_FORMAT})
+        return self.amounts[colour]
+
+
+def iter_rows(sheet, block_size=ROW_BLOCK):
+    """
+    Generate the cell values of a sheet row by row, converting block_size rows at a time,
+    so the values of a large sheet are never all held as Python objects at once.
+
+    Parameters:
+        sheet (pd.DataFrame): Data to be exported.
+        block_size (int): Rows converted at a time.
+
+    Yields:
+        tuple: Cell values of a row, see excel_values.
+    """
+
+    for start in range(0, len(sheet), block_size):
+        block = sheet.iloc[start:start + block_size]
+        yield from zip(*(excel_values(block.iloc[:, col]) for col in range(len(block.columns))))
+
+
+def write_sheet(ws, sheet, colours, formats):
+    """
+    Write a page of invoices to a worksheet with customised formatting.
+    Dates and amounts are written as typed cells with a number format, so they sort and filter as dates and numbers in Excel.
+    Rows are written in order from iter_rows, as constant_memory mode needs.
+
+    Parameters:
+        ws (xlsxwriter.worksheet.Worksheet): Worksheet to write to.
+        sheet (pd.DataFrame): Data to be exported.
+        colours (np.ndarray): Background colour of each row, from HighlightRules.colours.
+        formats (ReportFormats): Formats of the workbook.
+    """
+
+    # Format of every column and highlight colour, one format per colour rather than one per styled cell
+    column_formats = []
+    for column in sheet:
+        if pd.api.types.is_datetime64_any_dtype(sheet[column]):
+            column_format = formats.date if column in DATE_COLUMNS else formats.datetime
+        else:
+            column_format = formats.amount if column in AMOUNT_COLUMNS else formats.row
+        column_formats.append({colour: column_format(colour) for colour in np.unique(colours)})
+
+    # Iterate through columns to set column widths.
+    # Copied first, pandas 2.0 astype(str) can overwrite an object column unpickled in a worker process with the strings.
+    for column in sheet:
+        if column in DATE_COLUMNS and pd.api.types.is_datetime64_any_dtype(sheet[column]):
+            column_width = max(len(DATE_FORMAT), len(column))
+        else:
+            column_width = max(sheet[column].copy().astype(str).map(len).max(), len(column))
+        col_idx = sheet.columns.get_loc(column)
+        ws.set_column(col_idx, col_idx, column_width + 1, formats.num)
+
+    # Apply text wrapping format to the "Comments" column
+    comments_col_idx = sheet.columns.get_loc("Comments")
+    ws.set_column(comments_col_idx, comments_col_idx, 35, formats.text_wrap)
+
+    # Write the header, then every row with the format of its highlight colour
+    ws.write_row(0, 0, list(sheet.columns), formats.header)
+    for row, (values, colour) in enumerate(zip(iter_rows(sheet), colours), start=1):
+        for col, value in enumerate(values):
+            ws.write(row, col, value, column_formats[col][colour])
+
+
+def export_workbook(file_path, sheets, constant_memory=None):
+    """
+    Export pages of invoices to one Excel file, one worksheet each.
+
+    Parameters:
+        file_path (str): Path of the workbook.
+        sheets (list of tuple): (sheet, sheet name, colours) of every worksheet, see write_sheet.
+        constant_memory (bool, optional): Stream every row to a temporary file as it is written instead of keeping
+            the workbook in memory, at the cost of larger files without shared strings.
+            Used for workbooks of at least STREAM_MIN_ROWS rows if not given.
+
+    Returns:
+        str: Path of the written workbook.
+    """
+
+    if constant_memory is None:
+        constant_memory = sum(len(sheet) for sheet, _, _ in sheets) >= STREAM_MIN_ROWS
+
+    # Create the workbook directly with xlsxwriter, every cell is written once
+    with xlsxwriter.Workbook(file_path, {"constant_memory": constant_memory}) as wb:
+        formats = ReportFormats(wb)
+        for sheet, name, colours in sheets:
+            ws = wb.add_worksheet(name)
+            write_sheet(ws, sheet, colours, formats)
+            if constant_memory and CLOSE_STREAMED_SHEETS:
+                # xlsxwriter keeps the temporary file of every worksheet open until the workbook is closed,
+                # and reopens it then, so close it now to not run out of file handles with thousands of sheets
+                ws._opt_close()
+
+    return file_path
+
+
+def export_pages(sheet, page, file_path, colours):
+    """
+    Export a DataFrame to an Excel file with customised formatting.
+
+    Parameters:
+        sheet (pd.DataFrame): Data to be exported.
+        page (str): Name of the Excel sheet.
+        file_path (str): Path of the workbook, from report_path.
+        colours (np.ndarray): Background colour of each row, from HighlightRules.colours.
+
+    Returns:
+        str: Path of the written workbook.
+    """
+
+    return export_workbook(file_path, [(sheet, page, colours)])
+
+
+def export_all(jobs, workers=None, progress=no_progress, should_cancel=never_cancel, on_written=None):
+    """
+    Write every report workbook, fanning the jobs out to a pool of worker processes.
+    A workbook which fails does not stop the others, the failures are raised together at the end.
+
+    Parameters:
+        jobs (list of tuple): (file path, sheets) of each workbook, the arguments of export_workbook.
+        workers (int, optional): Number of worker processes, the number of CPUs if not given. 1 writes every workbook in this process.
+        progress (callable): Called with (stage, done, total) after every workbook.
+        should_cancel (callable): Returns True when writing should stop.
+        on_written (callable, optional): Called with the path of every workbook once it is written.
+
+    Returns:
+        list of str: Paths of the written workbooks, in job order.
+
+    Raises:
+        ProcessCancelled: If should_cancel asked to stop. Workbooks written before that are kept.
+        ExportError: If any workbook could not be written.
+    """
+
+    workers = workers or os.cpu_count() or 1
+    written = {}
+    failures = []
+    progress("Writing reports", 0, len(jobs))
+
+    if workers == 1 or len(jobs) < PARALLEL_MIN_JOBS:
+        for job in jobs:
+            if should_cancel():
+                raise ProcessCancelled()
+            try:
+                written[job[0]] = export_workbook(*job)
+            except Exception as e:
+                failures.append((job[0], e))
+            else:
+                if on_written is not None:
+                    on_written(written[job[0]])
+            progress("Writing reports", len(written) + len(failures), len(jobs))
+    else:
+        # Spawn rather than fork, the GUI process has Qt threads running and the exe is built for Windows
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs)), mp_context=multiprocessing.get_context("spawn")) as executor:
+            futures = {executor.submit(export_workbook, *job): job[0] for job in jobs}
+            for future in as_completed(futures):
+                if should_cancel():
+                    executor.shutdown(cancel_futures=True)
+                    raise ProcessCancelled()
+                try:
+                    written[futures[future]] = future.result()
+                except Exception as e:
+                    failures.append((futures[future], e))
+                else:
+                    if on_written is not None:
+                        on_written(written[futures[future]])
+                progress("Writing reports", len(written) + len(failures), len(jobs))
+
+    if len(failures) != 0:
+        order = {job[0]: ind for ind, job in enumerate(jobs)}
+        failures.sort(key=lambda failure: order[failure[0]])
+        raise ExportError(failures)
+
+    return [written[job[0]] for job in jobs]
+
+
+def staging_dir_for(output_dir):
+    """
+    Local staging folder of a reports folder, kept between runs so incremental runs find their workbooks.
+
+    Parameters:
+        output_dir (str): Folder the reports are copied to.
+
+    Returns:
+        str: Folder in STAGING_DIR.
+    """
+
+    return os.path.join(STAGING_DIR, hashlib.sha1(os.path.abspath(output_dir).encode()).hexdigest()[:12])
+
+
+class ReportCopier:
+    """
+    Copy report workbooks from the local staging folder to the reports folder on a background thread,
+    so writing the next workbooks does not wait on the network share.
+    Every file is copied under a temporary name and then renamed, so a partial file never appears in the reports folder,
+    and failed copies are retried. With an archive name, the files are sent together as one zip file instead.
+    """
+
+    def __init__(self, destination, archive_name=None, attempts=COPY_ATTEMPTS, retry_delay=COPY_RETRY_DELAY):
+        """
+        Parameters:
+            destination (str): Folder the files are copied to, created if missing.
+            archive_name (str, optional): Name of the zip file the files are sent in, each file is copied on its own if not given.
+            attempts (int): Tries of every copy.
+            retry_delay (float): Seconds before the first retry, doubled for every further retry.
+        """
+
+        self.destination = destination
+        self.archive_name = archive_name
+        self.attempts = attempts
+        self.retry_delay = retry_delay
+        self.queue = queue.Queue()
+        self.submitted = 0
+        self.copied = 0
+        self.archived = [] # Files waiting for the archive
+        self.failures = [] # (destination path, error) of the copies which failed every try
+        self.thread = threading.Thread(target=self.run, name="report-copier", daemon=True)
+        self.thread.start()
+
+
+    def submit(self, file_path):
+        """
+        Queue a written file to be copied.
+        """
+
+        self.submitted += 1
+        self.queue.put(("copy", file_path))
+
+
+    def remove(self, name):
+        """
+        Queue the removal of a file from the destination, such as a report no longer needed.
+        """
+
+        self.queue.put(("remove", name))
+
+
+    def run(self):
+        """
+        Copier thread: work through the queue until a None stops it.
+        """
+
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+
+            action, arg = item
+            if action == "remove":
+                self.delete(os.path.join(self.destination, arg))
+            elif self.archive_name is not None:
+                self.archived.append(arg)
+                self.copied += 1
+            else:
+                self.transfer(arg)
+
+
+    def retry(self, func, target):
+        """
+        Call func until it works or the attempts run out, waiting longer after every failure.
+
+        Returns:
+            bool: True if func worked.
+        """
+
+        for attempt in range(1, self.attempts + 1):
+            try:
+                func()
+                return True
+            except OSError as e:
+                error = e
+            if attempt < self.attempts:
+                logger.warning("Could not update %s, trying again: %s", target, error)
+                time.sleep(self.retry_delay * 2 ** (attempt - 1))
+
+        self.failures.append((target, error))
+        return False
+
+
+    def delete(self, target):
+        """
+        Remove a file from the destination, a file already gone is not an error.
+        """
+
+        def remove():
+            try:
+                os.remove(target)
+            except FileNotFoundError:
+                pass
+
+        self.retry(remove, target)
+
+
+    def transfer(self, file_path):
+        """
+        Copy a file to the destination under a temporary name, then rename it over the old file in one step.
+        """
+
+        target = os.path.join(self.destination, os.path.basename(file_path))
+        tmp_path = os.path.join(self.destination, f".{os.path.basename(file_path)}.{os.getpid()}.tmp")
+
+        def copy():
+            os.makedirs(self.destination, exist_ok=True)
+            try:
+                shutil.copyfile(file_path, tmp_path)
+                os.replace(tmp_path, target)
+            except OSError:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+        if self.retry(copy, target):
+            self.copied += 1
+
+
+    def close(self, progress=no_progress):
+        """
+        Wait until every queued file is copied, then send the archive if there is one.
+
+        Parameters:
+            progress (callable): Called with (stage, done, total) while waiting.
+
+        Raises:
+            ExportError: If any file could not be copied.
+        """
+
+        self.queue.put(None)
+        while self.thread.is_alive():
+            progress("Copying reports", self.copied, self.submitted)
+            self.thread.join(0.2)
+
+        if self.archived:
+            archive_path = os.path.join(os.path.dirname(self.archived[0]), self.archive_name)
+            with zipfile.ZipFile(archive_path, "w", zipfile.ZIP_STORED) as archive: # Workbooks are already compressed
+                for file_path in self.archived:
+                    archive.write(file_path, os.path.basename(file_path))
+            self.transfer(archive_path)
+        progress("Copying reports", self.copied, self.submitted)
+
+        if len(self.failures) != 0:
+            raise ExportError(self.failures)
+
+
+def workbook_digest(sheets):
+    """
+    Hash the content of a report workbook before it is written: sheet names, columns, cell values and row colours.
+
+    Parameters:
+        sheets (list of tuple): (sheet, sheet name, colours) of every worksheet, see export_workbook.
+
+    Returns:
+        str: Hex digest of the content.
+    """
+
+    digest = hashlib.sha256()
+    for sheet, name, colours in sheets:
+        # repr of the cell values is exact for floats and several times faster than pd.util.hash_pandas_object on small sheets
+        digest.update(repr([name, list(sheet.columns), list(map(str, sheet.dtypes)), sheet.to_numpy(dtype=object).tolist(), list(colours)]).encode())
+    return digest.hexdigest()
+
+
+def config_digest(routing, highlight):
+    """
+    Hash the configuration a run was made with, the routing index and the highlight rules.
+
+    Returns:
+        str: Hex digest of the configuration.
+    """
+
+    return hashlib.sha256(json.dumps([routing.to_dict(), vars(highlight), ReportManifest.VERSION], sort_keys=True).encode()).hexdigest()
+
+
+class ReportManifest:
+    """
+    Content hashes of the report workbooks written to an output folder on one day, saved as manifest.json in the folder.
+    When staging, it is saved in the staging folder and copied to the reports folder with the workbooks, see copy_reports.
+    A later run on the same day with the same configuration only rewrites the workbooks whose content changed,
+    and removes the workbooks of that day which are no longer part of the reports. Reports of other days are left alone.
+    """
+
+    VERSION = 2 # Raise when the content of the workbooks changes, so older manifests are not trusted
+
+    def __init__(self, output_dir, run_date, config_hash):
+        """
+        Parameters:
+            output_dir (str): Folder the reports are saved in.
+            run_date (str): Date of the run, as in the file names.
+            config_hash (str): Hash of the configuration, from config_digest.
+        """
+
+        self.path = os.path.join(output_dir, "manifest.json")
+        self.output_dir = output_dir
+        self.run_date = run_date
+        self.config_hash = config_hash
+        self.files = {} # File name to content hash of the workbooks written and unchanged
+        self.pending = {} # File name to content hash of the workbooks to be written
+        self.previous = {} # File name to content hash of the previous run, if its workbooks can be kept
+        self.previous_names = set() # Workbooks of the previous run of the day, whatever the configuration
+
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        if saved.get("version") == self.VERSION and saved.get("run_date") == run_date:
+            self.previous_names = set(saved["files"])
+            if saved.get("config") == config_hash:
+                self.previous = saved["files"]
+
+
+    def select(self, jobs):
+        """
+        Pick the export jobs whose workbook is missing or has changed since the previous run.
+
+        Parameters:
+            jobs (list of tuple): (file path, sheets) of each workbook, from paginate.
+
+        Returns:
+            list of tuple: Jobs to be written.
+        """
+
+        changed = []
+        for file_path, sheets in jobs:
+            name = os.path.basename(file_path)
+            digest = workbook_digest(sheets)
+            if self.previous.get(name) == digest and os.path.exists(file_path):
+                self.files[name] = digest
+            else:
+                self.pending[name] = digest
+                changed.append((file_path, sheets))
+        return changed
+
+
+    def remove_stale(self, jobs):
+        """
+        Remove the workbooks of the previous run of the day which are not part of these jobs.
+
+        Returns:
+            list of str: Names of the removed workbooks.
+        """
+
+        stale = sorted(self.previous_names - {os.path.basename(file_path) for file_path, _ in jobs})
+        for name in stale:
+            try:
+                os.remove(os.path.join(self.output_dir, name))
+            except FileNotFoundError:
+                pass
+        return stale
+
+
+    def mark_written(self, file_paths):
+        """
+        Record workbooks as written with the content they were selected with.
+        """
+
+        for file_path in file_paths:
+            name = os.path.basename(file_path)
+            self.files[name] = self.pending.pop(name)
+
+
+    def forget(self, names):
+        """
+        Drop workbooks from the manifest, such as those which could not be copied to the reports folder,
+        so the next run writes them again.
+        """
+
+        for name in names:
+            self.files.pop(name, None)
+
+
+    def save(self):
+        """
+        Save the manifest, replacing the file in one step so it is never left half written.
+        Workbooks selected but not marked written are left out, so the next run writes them again.
+        """
+
+        data = {"version": self.VERSION, "run_date": self.run_date, "config": self.config_hash, "files": self.files}
+        with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=1)
+        os.replace(self.path + ".tmp", self.path)
+
+
+def iter_master_data(file_path, statuses=REPORT_STATUSES, drop_columns=UNUSED_COLUMNS, should_cancel=never_cancel, batch_size=10000):
+    """
+    Stream the first sheet of a SpendConsole export in batches of rows, keeping only the rows and columns which are wanted.
+    Rows in other statuses and dropped columns are skipped while reading, so they never take up memory.
+    Text which pd.read_excel reads as a blank cell, such as "N/A" or "NULL" (NA_STRINGS), is read as None.
+
+    Parameters:
+        file_path (str): Path of the SpendConsole export.
+        statuses (list of str, optional): Statuses of the rows to keep, every row if None.
+        drop_columns (list of str): Columns to leave out.
+        should_cancel (callable): Returns True when reading should stop, checked every batch_size rows.
+        batch_size (int): Number of rows read between batches.
+
+    Yields:
+        tuple: Column names and a list of rows, at least once even for an empty export.
+    """
+
+    wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = list(next(rows, ()))
+
+        # Name blank and repeated headers the way pd.read_excel does
+        seen = {}
+        for col, name in enumerate(header):
+            name = f"Unnamed: {col}" if name is None else name
+            seen[name] = seen.get(name, -1) + 1
+            header[col] = name if seen[name] == 0 else f"{name}.{seen[name]}"
+
+        if "Status" not in header:
+            raise ValueError(f"The Status column is missing from {os.path.basename(file_path)}")
+        status_col = header.index("Status")
+        keep = [col for col, name in enumerate(header) if name not in drop_columns]
+        columns = [header[col] for col in keep]
+        statuses = set(statuses) if statuses is not None else None
+
+        data = []
+        for count, row in enumerate(rows, start=1):
+            if count % batch_size == 0:
+                if should_cancel():
+                    raise ProcessCancelled()
+                yield columns, data
+                data = []
+            if len(row) < len(header): # Read-only rows stop at their last filled cell
+                row = row + (None,) * (len(header) - len(row))
+            if statuses is None or row[status_col] in statuses:
+                data.append([None if value.__class__ is str and value in NA_STRINGS else value for value in (row[col] for col in keep)])
+        yield columns, data
+    finally:
+        wb.close()
+
+
+def read_master_data(file_path, statuses=REPORT_STATUSES, drop_columns=UNUSED_COLUMNS, should_cancel=never_cancel):
+    """
+    Read the first sheet of a SpendConsole export, keeping only the rows and columns which are reported.
+
+    Parameters:
+        file_path (str): Path of the SpendConsole export.
+        statuses (list of str, optional): Statuses of the rows to keep, every row if None.
+        drop_columns (list of str): Columns to leave out.
+        should_cancel (callable): Returns True when reading should stop, checked every 10,000 rows.
+
+    Returns:
+        pd.DataFrame: Master data DataFrame, typed the way pd.read_excel would type it.
+    """
+
+    data = []
+    for columns, rows in iter_master_data(file_path, statuses, drop_columns, should_cancel):
+        data.extend(rows)
+    return pd.DataFrame(data, columns=columns)
+
+
+def compact_dtypes(data_df):
+    """
+    Store the master data in compact types.
+    Repeated text becomes categorical and dates are parsed to datetime64 once.
+    Amounts stay float64, as float32 amounts drift by cents once thousands of them are added up.
+
+    Parameters:
+        data_df (pd.DataFrame): Master data DataFrame.
+
+    Returns:
+        tuple: Compacted DataFrame, memory used before and memory used after in bytes.
+    """
+
+    memory_before = data_df.memory_usage(deep=True).sum()
+    data_df = data_df.copy()
+
+    for col in CATEGORY_COLUMNS:
+        if col in data_df.columns and data_df[col].dtype == object and data_df[col].nunique() <= len(data_df) // 2:
+            data_df[col] = data_df[col].astype("category")
+
+    for col in DATE_COLUMNS:
+        if col in data_df.columns and not pd.api.types.is_datetime64_any_dtype(data_df[col]):
+            data_df[col] = pd.to_datetime(data_df[col], dayfirst=True)
+
+    memory_after = data_df.memory_usage(deep=True).sum()
+    logger.info("Master data memory %.1f MB -> %.1f MB", memory_before / 2**20, memory_after / 2**20)
+
+    return data_df, memory_before, memory_after
+
+
+class ImportCache:
+    """
+    On-disk cache of imported SpendConsole exports, keyed by the content hash and size of the file.
+    Entries are stored as Feather when pyarrow is installed and pickled otherwise.
+    The least recently used entries are removed once the cache grows past max_bytes.
+    """
+
+    VERSION = 3 # Bump when reading or compacting the master data changes
+
+    def __init__(self, cache_dir=IMPORT_CACHE_DIR, max_bytes=IMPORT_CACHE_MAX_BYTES):
+        """
+        Parameters:
+            cache_dir (str): Folder of the cached imports.
+            max_bytes (int): Size the cache is trimmed down to.
+        """
+
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+
+    def key(self, file_path, statuses=REPORT_STATUSES, drop_columns=UNUSED_COLUMNS):
+        """
+        Work out the cache key of a SpendConsole export.
+
+        Parameters:
+            file_path (str): Path of the SpendConsole export.
+            statuses (list of str, optional): Statuses of the rows imported, see read_master_data.
+            drop_columns (list of str): Columns left out of the import, see read_master_data.
+
+        Returns:
+            str: Cache key, which also changes when the import settings change.
+        """
+
+        settings = repr((self.VERSION, statuses, drop_columns, CATEGORY_COLUMNS, DATE_COLUMNS, AMOUNT_COLUMNS))
+        settings_hash = hashlib.sha256(settings.encode()).hexdigest()[:8]
+        return f"{file_digest(file_path)}-{os.path.getsize(file_path)}-{settings_hash}"
+
+
+    def load(self, key):
+        """
+        Load a cached import and mark it as recently used.
+
+        Parameters:
+            key (str): Cache key from key().
+
+        Returns:
+            pd.DataFrame: Cached master data, or None if it is not cached.
+        """
+
+        for extension, reader in [(".feather", pd.read_feather), (".pkl", pd.read_pickle)]:
+            path = os.path.join(self.cache_dir, key + extension)
+            if os.path.exists(path):
+                try:
+                    data_df = reader(path)
+                    os.utime(path)
+                    return data_df
+                except Exception: # A broken entry is dropped and the file is read again
+                    self.remove(path)
+        return None
+
+
+    def store(self, key, data_df):
+        """
+        Cache an import, then trim the cache. Failing to cache never fails the import.
+
+        Parameters:
+            key (str): Cache key from key().
+            data_df (pd.DataFrame): Master data DataFrame from read_master_data.
+        """
+
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = os.path.join(self.cache_dir, key)
+            stored = False
+            if pyarrow is not None:
+                try:
+                    data_df.to_feather(path + ".tmp")
+                    os.replace(path + ".tmp", path + ".feather")
+                    stored = True
+                except (ValueError, TypeError, pyarrow.ArrowException):
+                    pass # Columns Arrow cannot hold, such as mixed text and numbers, are pickled instead
+            if not stored:
+                data_df.to_pickle(path + ".tmp")
+                os.replace(path + ".tmp", path + ".pkl")
+            self.evict()
+        except OSError as e:
+            logger.warning("Could not cache import: %s", e)
+
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache fits in max_bytes.
+        """
+
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue # Replaced by another import being cached at the same time
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self.remove(path)
+            total -= size
+
+
+    def remove(self, path):
+        """
+        Remove a cache entry, ignoring one that is already gone or still open elsewhere.
+
+        Parameters:
+            path (str): Path of the entry.
+        """
+
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def invoice_key(value):
+    """
+    Text form of an invoice id, with whole numbers read as floats written without the decimal point.
+
+    Returns:
+        str: Invoice id, None for a blank id.
+    """
+
+    if value is None or value == "" or (isinstance(value, float) and math.isnan(value)):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+
+def parse_export(file_path, statuses=REPORT_STATUSES, drop_columns=UNUSED_COLUMNS):
+    """
+    Read and compact a SpendConsole export, run in a worker process by read_exports.
+
+    Returns:
+        pd.DataFrame: Compacted master data.
+    """
+
+    data_df, _, _ = compact_dtypes(read_master_data(file_path, statuses, drop_columns))
+    return data_df
+
+
+def read_exports(file_paths, cache=None, workers=None, progress=no_progress, should_cancel=never_cancel):
+    """
+    Read several SpendConsole exports at once, parsing those which are not cached in a pool of worker processes.
+    The invoice id and the rows of every status are kept, so merge_exports can find the invoices which are in
+    more than one export, including those no longer in a report status in the newer export.
+
+    Parameters:
+        file_paths (list of str): Paths of the SpendConsole exports.
+        cache (ImportCache, optional): Cache of previous imports, every export is parsed if not given.
+        workers (int, optional): Number of processes parsing exports, the number of CPUs if not given.
+        progress (callable): Called with (stage, done, total) as exports are read.
+        should_cancel (callable): Returns True when reading should stop, checked as each export is read.
+
+    Returns:
+        tuple: Compacted master data of every export in file order, and the number read from the cache.
+    """
+
+    drop_columns = [col for col in UNUSED_COLUMNS if col != ID_COLUMN]
+    frames = {}
+    keys = {}
+    for file_path in file_paths:
+        if cache is not None:
+            keys[file_path] = cache.key(file_path, None, drop_columns)
+            data_df = cache.load(keys[file_path])
+            if data_df is not None:
+                frames[file_path] = data_df
+    cached = len(frames)
+    progress("Reading data", len(frames), len(file_paths))
+
+    parse_paths = [file_path for file_path in file_paths if file_path not in frames]
+    workers = min(workers or os.cpu_count() or 1, max(len(parse_paths), 1))
+    if workers == 1:
+        for file_path in parse_paths:
+            if should_cancel():
+                raise ProcessCancelled()
+            frames[file_path] = parse_export(file_path, None, drop_columns)
+            progress("Reading data", len(frames), len(file_paths))
+    elif len(parse_paths) != 0:
+        # Spawn rather than fork, as in export_all
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            futures = {executor.submit(parse_export, file_path, None, drop_columns): file_path for file_path in parse_paths}
+            for future in as_completed(futures):
+                if should_cancel():
+                    executor.shutdown(cancel_futures=True)
+                    raise ProcessCancelled()
+                frames[futures[future]] = future.result()
+                progress("Reading data", len(frames), len(file_paths))
+
+    if cache is not None:
+        for file_path in parse_paths:
+            cache.store(keys[file_path], frames[file_path])
+
+    return [frames[file_path] for file_path in file_paths], cached
+
+
+def merge_exports(frames, file_paths):
+    """
+    Combine the master data of several exports into one, dropping the invoices found in more than one export,
+    then keep the rows in a report status. An invoice is taken from the last export it is in, with all its lines
+    from that export, so later exports should be the newer ones. Invoices are matched on ID_COLUMN, rows without
+    an invoice id on all their values.
+
+    Parameters:
+        frames (list of pd.DataFrame): Master data of every export, see read_exports.
+        file_paths (list of str): Paths of the exports, for error messages.
+
+    Returns:
+        tuple: Master data with the columns of the first export, and the number of duplicate rows dropped.
+
+    Raises:
+        ValueError: If an export does not have the same columns as the first one.
+    """
+
+    columns = list(frames[0].columns)
+    for data_df, file_path in zip(frames[1:], file_paths[1:]):
+        if set(data_df.columns) != set(columns):
+            missing = [col for col in columns if col not in data_df.columns]
+            extra = [col for col in data_df.columns if col not in columns]
+            raise ValueError(f"{os.path.basename(file_path)} does not have the columns of {os.path.basename(file_paths[0])}"
+                             f" (missing: {', '.join(map(str, missing)) or 'none'}, extra: {', '.join(map(str, extra)) or 'none'})")
+
+    data_df = pd.concat([data_df[columns] for data_df in frames], ignore_index=True)
+    file_no = np.repeat(np.arange(len(frames)), [len(data_df) for data_df in frames])
+
+    # Key of every row: its invoice id, or all of its values when it has none
+    keys = pd.util.hash_pandas_object(data_df, index=False).to_numpy()
+    if ID_COLUMN in data_df.columns:
+        invoice_ids = data_df[ID_COLUMN].astype(object).map(invoice_key)
+        has_id = invoice_ids.notna().to_numpy()
+        keys = np.where(has_id, pd.util.hash_pandas_object(invoice_ids.fillna(""), index=False).to_numpy(), keys)
+
+    keep = file_no == pd.Series(file_no).groupby(keys).transform("max").to_numpy()
+    duplicates = int((~keep).sum())
+    keep &= data_df["Status"].isin(REPORT_STATUSES).to_numpy()
+    return data_df.loc[keep].reset_index(drop=True), duplicates
+
+
+def read_inputs(file_path, config_path="Configuration.xlsx", cache=None, progress=no_progress, should_cancel=never_cancel, profiler=NO_PROFILER,
+                store=None, only_new=False, workers=None):
+    """
+    Read the master data and the routing index of the configuration, or of several configurations for run_configurations.
+
+    Parameters:
+        file_path (str or list of str): Path of the SpendConsole export. Several exports are read at the same time
+            and merged, invoices in more than one export are taken from the last one, see merge_exports.
+        config_path (str or list of str): Path of the configuration workbook, or paths of several.
+        cache (ImportCache, optional): Cache of previous imports, the file is always read if not given.
+        progress (callable): Called with (stage, done, total) as reading moves on.
+        should_cancel (callable): Returns True when reading should stop.
+        profiler (RunProfiler): Records the stages of reading.
+        store (InvoiceStore, optional): Invoice store the export is upserted into, the master data is then queried from it instead of the cache.
+        only_new (bool): With a store, only the invoices which are new since the previous import.
+        workers (int, optional): Number of processes parsing several exports, the number of CPUs if not given.
+
+    Returns:
+        tuple: Master data DataFrame, RoutingIndex and HighlightRules. Lists of the RoutingIndex and HighlightRules
+            of every configuration, in order, when config_path is a list.
+
+    Raises:
+        ValueError: If the exports do not all have the same columns.
+    """
+
+    file_paths = [file_path] if isinstance(file_path, str) else list(file_path)
+    key = None # Cache key of a single export
+    progress("Reading data", 0, 0)
+    if store is not None:
+        with profiler.stage("store import", files=len(file_paths), file_bytes=sum(map(os.path.getsize, file_paths))):
+            _, previous_import = store.import_file(file_paths if len(file_paths) > 1 else file_paths[0], should_cancel)
+        with profiler.stage("read", cached=False) as record:
+            data_df = store.frame(REPORT_STATUSES, new_since=previous_import if only_new else None)
+            record["rows"] = len(data_df)
+        compacted = False
+    elif len(file_paths) > 1:
+        with profiler.stage("read", files=len(file_paths), file_bytes=sum(map(os.path.getsize, file_paths))) as record:
+            frames, record["cached_files"] = read_exports(file_paths, cache, workers, progress, should_cancel)
+            record["rows"] = sum(len(frame) for frame in frames)
+        with profiler.stage("merge", rows=record["rows"]) as record:
+            data_df, duplicates = merge_exports(frames, file_paths)
+            record["duplicates"] = duplicates
+        compacted = False # Categories differ between the exports, so the merged data is compacted again
+        if duplicates != 0:
+            logger.info("Dropped %d lines of invoices found in more than one export", duplicates)
+    else:
+        with profiler.stage("read", file_bytes=os.path.getsize(file_paths[0])) as record:
+            key = cache.key(file_paths[0]) if cache is not None else None
+            data_df = cache.load(key) if cache is not None else None
+            record["cached"] = data_df is not None
+            if data_df is None:
+                data_df = read_master_data(file_paths[0], should_cancel=should_cancel)
+            record["rows"] = len(data_df)
+        compacted = record["cached"]
+
+    if should_cancel():
+        raise ProcessCancelled()
+
+    if not compacted:
+        progress("Compacting data", 0, 0)
+        with profiler.stage("compact", rows=len(data_df)) as record:
+            data_df, _, after = compact_dtypes(data_df)
+            record["memory_mb"] = round(after / 2**20, 1)
+        if key is not None:
+            with profiler.stage("cache store", rows=len(data_df)):
+                cache.store(key, data_df)
+
+    progress("Reading configuration", 0, 0)
+    config_paths = [config_path] if isinstance(config_path, str) else list(config_path)
+    with profiler.stage("config", configurations=len(config_paths)) as record:
+        routings, highlights = (list(loaded) for loaded in zip(*map(load_configuration, config_paths)))
+        record["pages"] = sum(len(routing.pages) for routing in routings)
+
+    if isinstance(config_path, str):
+        return data_df, routings[0], highlights[0]
+    return data_df, routings, highlights
+
+
+def clean_master_data(data_df, routing=None):
+    """
+    Keep the invoices to report and get them ready for pagination.
+
+    Parameters:
+        data_df (pd.DataFrame): Master data DataFrame.
+        routing (RoutingIndex, optional): Supplier routing index, see check_routing. Not checked if not given.
+
+    Returns:
+        pd.DataFrame: Invoices with a report status, blank entities filled and credit memo amounts negated.
+
+    Raises:
+        ValueError: If a supplier has no page in the configuration.
+    """
+
+    data_df = data_df.drop(columns=UNUSED_COLUMNS, errors="ignore") # Incase they do not have following columns
+    data_df = data_df.loc[data_df['Status'].isin(REPORT_STATUSES)].reset_index(drop=True)
+    if isinstance(data_df["Entity"].dtype, pd.CategoricalDtype) and "BLANK" not in data_df["Entity"].cat.categories:
+        data_df["Entity"] = data_df["Entity"].cat.add_categories("BLANK")
+    data_df["Entity"] = data_df["Entity"].fillna("BLANK")
+
+    # Stop before anything is written if a supplier has nowhere to go
+    if routing is not None:
+        check_routing(data_df, routing)
+
+    # Credit memos are reported as negative amounts, a blank IsCreditMemo cell is not a credit memo as for the highlighting
+    credit_rows = (data_df["IsCreditMemo"] == True).to_numpy()
+    amount_cols = [col for col in AMOUNT_COLUMNS if col in data_df.columns]
+    data_df.loc[credit_rows, amount_cols] *= -1
+
+    return data_df
+
+
+def check_routing(data_df, routing, config_name="Configuration"):
+    """
+    Check that every supplier of the invoices has a page.
+
+    Parameters:
+        data_df (pd.DataFrame): Master data DataFrame.
+        routing (RoutingIndex): Supplier routing index.
+        config_name (str): Name of the configuration, for the error message.
+
+    Raises:
+        ValueError: If a supplier has no page in the configuration.
+    """
+
+    unrouted = routing.unroutable(data_df["Supplier Name"])
+    if len(unrouted) != 0:
+        raise ValueError(f"No page in {config_name}.xlsx for supplier(s): {', '.join(map(str, unrouted))}")
+
+
+def paginate(data_df, pages, colours, output_dir=REPORT_DIR, run_date=None, output_mode="file", page_size=PAGE_SIZE):
+    """
+    Sort the invoices of every entity/page, split them into sheets of page_size lines and gather the sheets into workbooks.
+
+    Parameters:
+        data_df (pd.DataFrame): Cleaned master data, see clean_master_data.
+        pages (pd.Categorical): Page of every row, with the pages in configuration order as categories.
+        colours (np.ndarray): Highlight colour of every row.
+        output_dir (str): Folder the reports are saved in.
+        run_date (str, optional): Date in the file names, today if not given.
+        output_mode (str): One of OUTPUT_MODES. "file" writes a workbook per sheet, "entity" a workbook per entity
+            and "run" a single workbook, the last two with one worksheet per sheet.
+        page_size (int): Maximum number of invoice lines in one sheet.
+
+    Returns:
+        list of tuple: (file path, sheets) for export_workbook, one per workbook.
+    """
+
+    if output_mode not in OUTPUT_MODES:
+        raise ValueError(f"Unknown output mode {output_mode!r}, expected one of {', '.join(OUTPUT_MODES)}")
+    if page_size < 1:
+        raise ValueError(f"The page size must be at least 1, not {page_size}")
+
+    # Keep entities in order of appearance and pages in configuration order.
+    # File names are fixed here, before any workbook is written.
+    entities = pd.Categorical(data_df["Entity"], categories=data_df["Entity"].unique())
+    run_date = run_date or datetime.now().strftime('%d-%m-%Y')
+
+    # Sort once by entity, page and the order within a page, then take every entity/page as a slice of the sorted frame.
+    # The sort is stable like the groupby it replaces, and rows without a page are left out as groupby did.
+    keys = pd.DataFrame({"entity": entities.codes, "page": pages.codes, "Supplier Name": data_df["Supplier Name"].to_numpy(),
+                         "Invoice Date": data_df["Invoice Date"].to_numpy(), "PO #": data_df["PO #"].to_numpy()})
+    keys = keys.loc[(entities.codes >= 0) & (pages.codes >= 0)]
+    order = keys.sort_values(by=list(keys.columns), kind="stable").index.to_numpy()
+    sorted_df = data_df.take(order)
+    sorted_colours = colours[order]
+    group_codes = keys.loc[order, ["entity", "page"]].to_numpy()
+    bounds = np.concatenate([[0], np.flatnonzero((group_codes[1:] != group_codes[:-1]).any(axis=1)) + 1, [len(order)]])
+
+    workbooks = {} # File path to its sheets, in order
+    used_names = {} # File path to the sheet names used in it
+    for group_start, group_end in zip(bounds[:-1], bounds[1:]):
+        if group_end - group_start > 1:
+            entity = entities.categories[group_codes[group_start, 0]]
+            page = pages.categories[group_codes[group_start, 1]]
+            for ind, start in enumerate(range(group_start, group_end, page_size), start=1):
+                end = min(start + page_size, group_end)
+                chunk = sorted_df.iloc[start:end]
+                if output_mode == "file":
+                    file_path, name = report_path(page, entity, ind, run_date, output_dir), page
+                elif output_mode == "entity":
+                    file_path, name = entity_report_path(entity, run_date, output_dir), f"{page} - {ind}"
+                else:
+                    file_path, name = run_report_path(run_date, output_dir), f"{entity} {page} - {ind}"
+                name = sheet_name(name, used_names.setdefault(file_path, set()))
+                workbooks.setdefault(file_path, []).append((chunk, name, sorted_colours[start:end]))
+
+    return list(workbooks.items())
+
+
+def supplier_statistics(data_df, pages):
+    """
+    Summarise the routed invoices of every entity and page in one groupby: lines, amount totals,
+    credit memo lines and total, and lines by invoice age in AGEING_BUCKETS.
+
+    Parameters:
+        data_df (pd.DataFrame): Cleaned master data, see clean_master_data, with "Invoice Date" still as datetimes.
+        pages (pd.Categorical): Page of every row, rows without a page are left out.
+
+    Returns:
+        pd.DataFrame: One row per entity and page with invoices, entities in order of appearance and pages in configuration order,
+            then a Total row.
+    """
+
+    # Age in whole days as for the highlighting, invoices without a date are in no age column
+    today = pd.Timestamp(datetime.now().date())
+    age = (today - data_df["Invoice Date"].dt.normalize()).dt.days.to_numpy()
+    credit = (data_df["IsCreditMemo"] == True).to_numpy()
+    age_labels = [f"{low + 1 if low else 0}-{high} Days" for low, high in zip([0] + AGEING_BUCKETS[:-1], AGEING_BUCKETS)] + [f"Over {AGEING_BUCKETS[-1]} Days"]
+    age_bucket = np.searchsorted(AGEING_BUCKETS, age, side="left") # Index of the age column of every row
+
+    columns = {"Entity": pd.Categorical(data_df["Entity"], categories=data_df["Entity"].unique()), "Page": pages, "Lines": np.ones(len(data_df), dtype=np.int64)}
+    for col in AMOUNT_COLUMNS:
+        if col in data_df.columns:
+            columns[col] = np.round(data_df[col].to_numpy(dtype=np.float64), 2) # Whole cents, so the totals add up to the cent
+    columns["Credit Memo Lines"] = credit.astype(np.int64)
+    if "Total" in data_df.columns:
+        columns["Credit Memo Total"] = np.where(credit, columns["Total"], 0.0)
+    for ind, label in enumerate(age_labels):
+        columns[label] = ((age_bucket == ind) & ~np.isnan(age)).astype(np.int64)
+
+    summary_df = pd.DataFrame(columns).groupby(["Entity", "Page"], sort=True, observed=True).sum().reset_index()
+    summary_df = summary_df.astype({"Entity": object, "Page": object})
+    total_df = pd.DataFrame([{"Entity": "Total", "Page": "", **{col: summary_df[col].sum() for col in summary_df.columns[2:]}}])
+    return pd.concat([summary_df, total_df], ignore_index=True).round(2)
+
+
+def write_statistics(count_dict, summary_df, file_path):
+    """
+    Write the Supplier Statistic file. A workbook keeps the lines per page on its first sheet as before,
+    with the summary on a Summary sheet. A CSV file holds the summary only.
+
+    Parameters:
+        count_dict (dict): Number of lines of every page.
+        summary_df (pd.DataFrame): Summary from supplier_statistics.
+        file_path (str): Path of the .xlsx or .csv file.
+    """
+
+    if file_path.endswith(".csv"):
+        summary_df.to_csv(file_path, index=False)
+        return
+
+    count_df = pd.DataFrame.from_dict(count_dict,columns=["NO. PO Lines"], orient='index')
+    with pd.ExcelWriter(file_path) as writer:
+        count_df.T.to_excel(writer)
+        summary_df.to_excel(writer, sheet_name="Summary", index=False)
+
+
+def copy_reports(copier, manifest=None, progress=no_progress):
+    """
+    Wait for a ReportCopier to finish. Workbooks which could not be copied are dropped from the manifest,
+    so the next incremental run writes and copies them again. The manifest stays in the staging folder for the next run
+    and is then copied to the reports folder as well, where it lists the workbooks which are there.
+
+    Raises:
+        ExportError: If any file could not be copied.
+    """
+
+    try:
+        copier.close(progress)
+    except ExportError as e:
+        if manifest is not None:
+            manifest.forget(os.path.basename(file_path) for file_path, _ in e.failures)
+            manifest.save()
+            copier.transfer(manifest.path)
+        raise
+
+    if manifest is not None:
+        copier.transfer(manifest.path)
+        if len(copier.failures) != 0:
+            raise ExportError(copier.failures)
+
+
+def main(data_df, supp_df, highlight=None, workers=None, output_dir=REPORT_DIR, progress=no_progress, should_cancel=never_cancel, profiler=NO_PROFILER,
+         output_mode="file", incremental=False, staging_dir=None, archive=False, page_size=PAGE_SIZE, statistics="xlsx", cleaned=False):
+    """
+    Main function to process and export data.
+
+    Parameters:
+        data_df (pd.DataFrame): Master data DataFrame.
+        supp_df (pd.DataFrame or RoutingIndex): Supplier data DataFrame, or its compiled routing index.
+        highlight (HighlightRules, optional): Row highlight rules, the defaults if not given.
+        workers (int, optional): Number of processes writing workbooks, the number of CPUs if not given.
+        output_dir (str): Folder the reports are saved in.
+        progress (callable): Called with (stage, done, total) as processing moves on.
+        should_cancel (callable): Returns True when processing should stop, checked between workbooks.
+        profiler (RunProfiler): Records the stages of processing.
+        output_mode (str): One of OUTPUT_MODES, how the sheets are gathered into workbooks, see paginate.
+        incremental (bool): Only write the workbooks which changed since the previous run of the day, see ReportManifest.
+        staging_dir (str, optional): Local folder the reports are written to first, then copied to output_dir
+            in the background by a ReportCopier. Reports are written straight to output_dir if not given.
+        archive (bool): With staging_dir, send the reports to output_dir as one zip file.
+        page_size (int): Maximum number of invoice lines in one sheet.
+        statistics (str): One of STATISTICS_FORMATS, the file type of Supplier Statistic, see write_statistics.
+        cleaned (bool): data_df was already cleaned by clean_master_data, as run_configurations does, so only the routing is checked.
+
+    Raises:
+        ProcessCancelled: If should_cancel asked to stop. Workbooks written before that are kept.
+        ExportError: If any workbook could not be written or copied.
+    """
+
+    if statistics not in STATISTICS_FORMATS:
+        raise ValueError(f"Unknown statistics format {statistics!r}, expected one of {', '.join(STATISTICS_FORMATS)}")
+    progress("Sorting data", 0, 0)
+
+    # Get Supplier routing index
+    if isinstance(supp_df, RoutingIndex):
+        routing = supp_df
+    else:
+        with profiler.stage("config") as record:
+            routing = RoutingIndex.from_frame(supp_df)
+            record["pages"] = len(routing.pages)
+    highlight = highlight if highlight is not None else HighlightRules()
+
+    # Clean the Master Data
+    if cleaned:
+        check_routing(data_df, routing)
+    else:
+        with profiler.stage("clean", rows=len(data_df)) as record:
+            data_df = clean_master_data(data_df, routing)
+            record["report_rows"] = len(data_df)
+
+    # Highlight colour of every row, worked out once from the datetime column before pagination
+    with profiler.stage("styling", rows=len(data_df)):
+        colours = highlight.colours(data_df)
+
+    # Sort rows of data into appropriate pages, one sheet per page_size lines of each entity/supplier
+    with profiler.stage("routing", rows=len(data_df)):
+        pages = pd.Categorical(routing.route(data_df["Supplier Name"]), categories=routing.pages)
+        count_dict = pd.Series(pages).value_counts(sort=False).to_dict()
+    run_date = datetime.now().strftime('%d-%m-%Y')
+    write_dir = staging_dir if staging_dir is not None else output_dir
+    if staging_dir is not None:
+        os.makedirs(staging_dir, exist_ok=True)
+    with profiler.stage("paginate", rows=len(data_df)) as record:
+        jobs = paginate(data_df, pages, colours, write_dir, run_date, output_mode, page_size)
+        record["workbooks"] = len(jobs)
+        record["sheets"] = sum(len(sheets) for _, sheets in jobs)
+
+    # Skip the workbooks which are already up to date. The manifest is saved before writing with only those,
+    # so workbooks being written when a run fails or is cancelled are written again next time.
+    manifest = None
+    write_jobs = jobs
+    if incremental:
+        with profiler.stage("manifest", workbooks=len(jobs)) as record:
+            manifest = ReportManifest(write_dir, run_date, config_digest(routing, highlight))
+            write_jobs = manifest.select(jobs)
+            stale = manifest.remove_stale(jobs)
+            record["removed"] = len(stale)
+            record["unchanged"] = len(jobs) - len(write_jobs)
+            manifest.save()
+        logger.info("%d of %d workbooks unchanged since the previous run", len(jobs) - len(write_jobs), len(jobs))
+
+    # Copy every workbook to the reports folder as soon as it is written, while the next ones are being written.
+    # Workbooks of earlier runs left in the staging folder are removed, it only keeps those of the last run for incremental runs.
+    copier = None
+    if staging_dir is not None:
+        copier = ReportCopier(output_dir, f"{run_date} Reports.zip" if archive else None)
+        current = {os.path.basename(file_path) for file_path, _ in jobs}
+        for name in os.listdir(staging_dir):
+            if name.endswith(".xlsx") and name not in current:
+                os.remove(os.path.join(staging_dir, name))
+        if manifest is not None:
+            for name in stale:
+                copier.remove(name)
+            # Unchanged workbooks are checked against the staging folder, those since deleted from the reports folder are copied again
+            if not archive:
+                for file_path in sorted(set(file_path for file_path, _ in jobs) - set(file_path for file_path, _ in write_jobs)):
+                    if not os.path.exists(os.path.join(output_dir, os.path.basename(file_path))):
+                        copier.submit(file_path)
+
+    try:
+        with profiler.stage("write", rows=sum(len(sheet) for _, sheets in write_jobs for sheet, _, _ in sheets), workbooks=len(write_jobs),
+                            workers=workers or os.cpu_count() or 1):
+            try:
+                written = export_all(write_jobs, workers, progress, should_cancel, copier.submit if copier is not None else None)
+            except ExportError as e:
+                if manifest is not None:
+                    failed = {file_path for file_path, _ in e.failures}
+                    manifest.mark_written(file_path for file_path, _ in write_jobs if file_path not in failed)
+                    manifest.save()
+                raise
+            if manifest is not None:
+                manifest.mark_written(written)
+                manifest.save()
+
+        progress("Writing statistics", len(jobs), len(jobs))
+        statistics_path = f"{write_dir}/Supplier Statistic.{statistics}"
+        with profiler.stage("statistics", rows=len(data_df), pages=len(count_dict)) as record:
+            summary_df = supplier_statistics(data_df, pages)
+            record["summary_rows"] = len(summary_df)
+            write_statistics(count_dict, summary_df, statistics_path)
+
+        if copier is not None:
+            copier.submit(statistics_path)
+            if archive: # The archive holds every report, unchanged ones included
+                for file_path in sorted(set(file_path for file_path, _ in jobs) - set(written)):
+                    copier.submit(file_path)
+    except BaseException:
+        # Still copy the workbooks written before the failure, without hiding it behind copy errors
+        if copier is not None:
+            try:
+                copy_reports(copier, manifest)
+            except ExportError as e:
+                logger.error("%s", e)
+        raise
+
+    if copier is not None:
+        with profiler.stage("copy", files=copier.submitted):
+            copy_reports(copier, manifest, progress)
+
+
+def run_configurations(data_df, configurations, output_dir=REPORT_DIR, staging=False, profiler=NO_PROFILER, **options):
+    """
+    Make the reports of several configurations, such as AP teams with their own page split, from one import.
+    The master data is cleaned once and shared, then every configuration is routed, paginated and written on its own.
+    The reports of the first configuration, the main one, are saved in output_dir as with main,
+    those of every other configuration in a sub-folder of output_dir named after it.
+
+    Parameters:
+        data_df (pd.DataFrame): Master data DataFrame.
+        configurations (list of tuple): Name, RoutingIndex and HighlightRules of every configuration, see configuration_name.
+        output_dir (str): Folder of the reports of the main configuration and of the sub-folders of the others.
+        staging (bool): Write the reports of every configuration to its own staging folder first, see staging_dir_for.
+        profiler (RunProfiler): Records the stages of processing, each with the name of its configuration.
+        **options: Other arguments of main, such as workers, progress, should_cancel or incremental.
+
+    Raises:
+        ValueError: If a supplier has no page in one of the configurations, before any report is written.
+        ProcessCancelled: If should_cancel asked to stop. Workbooks written before that are kept.
+        ExportError: If any workbook of a configuration could not be written or copied, the next configurations are not processed.
+    """
+
+    with profiler.stage("clean", rows=len(data_df), configurations=len(configurations)) as record:
+        data_df = clean_master_data(data_df)
+        record["report_rows"] = len(data_df)
+    for name, routing, _ in configurations:
+        check_routing(data_df, routing, name)
+
+    for ind, (name, routing, highlight) in enumerate(configurations):
+        config_dir = output_dir if ind == 0 else os.path.join(output_dir, name)
+        os.makedirs(config_dir, exist_ok=True)
+        profiler.labels["configuration"] = name
+        try:
+            main(data_df, routing, highlight, output_dir=config_dir, profiler=profiler, staging_dir=staging_dir_for(config_dir) if staging else None,
+                 cleaned=True, **options)
+        finally:
+            profiler.labels.pop("configuration", None)
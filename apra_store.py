@@ -0,0 +1,289 @@
+# Local SQLite store of the SpendConsole invoices of the AP Reports Automation Program.
+# Every import is upserted on the invoice unique id, every line of an invoice being a row of its own,
+# so the invoices new since the last import can be reported with an indexed query.
+
+import os
+import json
+import sqlite3
+import hashlib
+import logging
+import numpy as np
+import pandas as pd
+from datetime import datetime, date, time
+from apra_pipeline import REPORT_STATUSES, ID_COLUMN, never_cancel, file_digest, iter_master_data, invoice_key
+
+
+STORE_PATH = os.path.join(os.environ.get("LOCALAPPDATA", os.path.expanduser("~/.cache")), "APRA", "invoices.sqlite3")
+SCHEMA_VERSION = 2 # Kept in PRAGMA user_version, stores of an older version are emptied and filled again by the next import
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS imports (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    file TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    imported TEXT NOT NULL,
+    rows INTEGER NOT NULL,
+    columns TEXT NOT NULL, -- JSON list of the columns, in export order
+    datetime_columns TEXT NOT NULL -- JSON list of the columns holding dates
+);
+CREATE TABLE IF NOT EXISTS invoices (
+    invoice_id TEXT NOT NULL,
+    line INTEGER NOT NULL, -- Line of the invoice in its last import, from 0 in export order
+    entity TEXT,
+    supplier TEXT,
+    status TEXT,
+    invoice_date TEXT,
+    position INTEGER NOT NULL, -- Row of the invoice in its last import, so exports keep their row order
+    data TEXT NOT NULL, -- JSON object of every column
+    row_hash TEXT NOT NULL,
+    first_import INTEGER NOT NULL,
+    changed_import INTEGER NOT NULL,
+    last_import INTEGER NOT NULL,
+    PRIMARY KEY (invoice_id, line)
+);
+CREATE INDEX IF NOT EXISTS invoices_entity ON invoices (entity);
+CREATE INDEX IF NOT EXISTS invoices_supplier ON invoices (supplier);
+CREATE INDEX IF NOT EXISTS invoices_status ON invoices (status);
+CREATE INDEX IF NOT EXISTS invoices_invoice_date ON invoices (invoice_date);
+CREATE INDEX IF NOT EXISTS invoices_last_import ON invoices (last_import, position);
+"""
+
+# Lines of an import are staged in a temporary table first, as the lines of an invoice are replaced together.
+# Created in the transaction of the import, so cancelling the import drops it too.
+CREATE_INCOMING = """
+CREATE TEMP TABLE incoming (
+    invoice_id TEXT NOT NULL,
+    line INTEGER NOT NULL,
+    file_no INTEGER NOT NULL, -- Export of the import the line is from
+    entity TEXT,
+    supplier TEXT,
+    status TEXT,
+    invoice_date TEXT,
+    position INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    row_hash TEXT NOT NULL
+)
+"""
+
+INDEX_INCOMING = "CREATE INDEX temp.incoming_invoice ON incoming (invoice_id, file_no)"
+
+INSERT_INCOMING = "INSERT INTO incoming VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+
+# An invoice in more than one export of an import is taken from the last of them, with all its lines
+DROP_OLDER_EXPORTS = """
+DELETE FROM incoming WHERE file_no < (SELECT MAX(file_no) FROM incoming AS newer WHERE newer.invoice_id = incoming.invoice_id)
+"""
+
+# Every line of an imported invoice replaces the lines it had before. The invoice keeps the import which first brought it,
+# and each line the import which last changed it when it has the same content as the line it replaces.
+SAVE_PREVIOUS = """
+CREATE TEMP TABLE previous AS
+SELECT invoice_id, line, row_hash, first_import, changed_import FROM invoices WHERE invoice_id IN (SELECT invoice_id FROM incoming)
+"""
+
+DELETE_REPLACED = "DELETE FROM invoices WHERE invoice_id IN (SELECT invoice_id FROM incoming)"
+
+INSERT_LINES = """
+INSERT INTO invoices (invoice_id, line, entity, supplier, status, invoice_date, position, data, row_hash, first_import, changed_import, last_import)
+SELECT i.invoice_id, i.line, i.entity, i.supplier, i.status, i.invoice_date, i.position, i.data, i.row_hash,
+       COALESCE((SELECT MIN(first_import) FROM previous AS p WHERE p.invoice_id = i.invoice_id), :import_id),
+       CASE WHEN p.row_hash = i.row_hash THEN p.changed_import ELSE :import_id END,
+       :import_id
+FROM incoming AS i LEFT JOIN previous AS p ON p.invoice_id = i.invoice_id AND p.line = i.line
+"""
+
+logger = logging.getLogger(__name__)
+
+
+def json_value(value):
+    """
+    JSON form of the cell values JSON does not know, dates as ISO 8601 text.
+    """
+
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Cannot store {type(value).__name__} values")
+
+
+class InvoiceStore:
+    """
+    SQLite store of the invoices of every SpendConsole export imported, keyed on the invoice unique id.
+    The invoices of the last import are the current ones; each invoice also records the import which first
+    brought it and the import which last changed it.
+    """
+
+    def __init__(self, db_path=STORE_PATH):
+        """
+        Parameters:
+            db_path (str): Path of the SQLite database, created if missing.
+        """
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.db_path = db_path
+        self.connection = sqlite3.connect(db_path)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+        if version < SCHEMA_VERSION:
+            # Stores of version 1 kept a single line of every invoice, so they cannot be upgraded
+            if self.connection.execute("SELECT COUNT(*) FROM sqlite_master WHERE name = 'invoices'").fetchone()[0] != 0:
+                logger.warning("Emptying the invoice store %s made by an older version, it is filled again by the next import", db_path)
+            self.connection.executescript(f"DROP TABLE IF EXISTS invoices; DROP TABLE IF EXISTS imports; PRAGMA user_version = {SCHEMA_VERSION};")
+        self.connection.executescript(SCHEMA)
+
+
+    def close(self):
+        self.connection.execute("PRAGMA optimize") # Keeps the statistics the query planner picks indexes with up to date
+        self.connection.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+    def latest_import(self):
+        """
+        Returns:
+            int: Id of the last import, None if nothing was imported yet.
+        """
+
+        return self.connection.execute("SELECT MAX(id) FROM imports").fetchone()[0]
+
+
+    def import_file(self, file_path, should_cancel=never_cancel):
+        """
+        Upsert every invoice of a SpendConsole export, streaming it in batches.
+        The lines of an invoice replace all the lines it had before, so an invoice with fewer lines loses the others.
+        Importing the same file as the last import again does nothing.
+
+        Parameters:
+            file_path (str or list of str): Path of the SpendConsole export. Several exports are imported together
+                as one import, in order, so an invoice in more than one of them is taken from the last.
+            should_cancel (callable): Returns True when importing should stop, the store is then left as it was.
+
+        Returns:
+            tuple: Id of the import and id of the import before it (None for the first import).
+
+        Raises:
+            ValueError: If an export has no invoice unique id column or not the columns of the first export.
+        """
+
+        file_paths = [file_path] if isinstance(file_path, str) else list(file_path)
+        digest = file_digest(file_paths[0]) if len(file_paths) == 1 else hashlib.sha256(" ".join(map(file_digest, file_paths)).encode()).hexdigest()
+        previous = self.connection.execute("SELECT id, digest FROM imports ORDER BY id DESC LIMIT 1").fetchone()
+        if previous is not None and previous[1] == digest:
+            before = self.connection.execute("SELECT MAX(id) FROM imports WHERE id < ?", (previous[0],)).fetchone()[0]
+            return previous[0], before
+
+        position = 0
+        skipped = 0
+        datetime_columns = set()
+        with self.connection: # One transaction, rolled back on errors and cancelling
+            cursor = self.connection.execute("INSERT INTO imports (file, digest, imported, rows, columns, datetime_columns) VALUES (?, ?, ?, 0, '[]', '[]')",
+                                             (", ".join(map(os.path.basename, file_paths)), digest, datetime.now().isoformat(timespec="seconds")))
+            import_id = cursor.lastrowid
+
+            self.connection.execute(CREATE_INCOMING)
+            self.connection.execute(INDEX_INCOMING)
+            first_columns = None
+            for file_no, file_path in enumerate(file_paths):
+                lines = {} # Invoice id to the number of its lines in this export
+                for columns, rows in iter_master_data(file_path, statuses=None, drop_columns=(), should_cancel=should_cancel):
+                    if ID_COLUMN not in columns:
+                        raise ValueError(f"The {ID_COLUMN} column is missing from {os.path.basename(file_path)}")
+                    if first_columns is None:
+                        first_columns = columns
+                    elif set(columns) != set(first_columns):
+                        raise ValueError(f"{os.path.basename(file_path)} does not have the columns of {os.path.basename(file_paths[0])}")
+                    index = {name: col for col, name in enumerate(columns)}
+
+                    records = []
+                    for row in rows:
+                        invoice_id = invoice_key(row[index[ID_COLUMN]])
+                        if invoice_id is None:
+                            skipped += 1
+                            continue
+                        datetime_columns.update(name for name, value in zip(columns, row) if isinstance(value, (datetime, date)))
+                        data = json.dumps(dict(zip(columns, row)), default=json_value)
+                        invoice_date = row[index["Invoice Date"]] if "Invoice Date" in index else None
+                        line = lines.get(invoice_id, 0)
+                        lines[invoice_id] = line + 1
+                        records.append((invoice_id, line, file_no,
+                                        row[index["Entity"]] if "Entity" in index else None,
+                                        row[index["Supplier Name"]] if "Supplier Name" in index else None,
+                                        row[index["Status"]],
+                                        json_value(invoice_date) if isinstance(invoice_date, (datetime, date)) else invoice_date,
+                                        position, data, hashlib.sha1(data.encode()).hexdigest()))
+                        position += 1
+                    self.connection.executemany(INSERT_INCOMING, records)
+
+            self.connection.execute(DROP_OLDER_EXPORTS)
+            self.connection.execute(SAVE_PREVIOUS)
+            self.connection.execute(DELETE_REPLACED)
+            self.connection.execute(INSERT_LINES, {"import_id": import_id})
+            line_count = self.connection.execute("SELECT COUNT(*) FROM incoming").fetchone()[0]
+            self.connection.execute("UPDATE imports SET rows = ?, columns = ?, datetime_columns = ? WHERE id = ?",
+                                    (line_count, json.dumps(first_columns), json.dumps(sorted(datetime_columns)), import_id))
+
+        self.connection.execute("DROP TABLE temp.incoming")
+        self.connection.execute("DROP TABLE temp.previous")
+        if skipped != 0:
+            logger.warning("Skipped %d rows without %s in %s", skipped, ID_COLUMN, ", ".join(file_paths))
+        return import_id, previous[0] if previous is not None else None
+
+
+    def frame(self, statuses=REPORT_STATUSES, entity=None, suppliers=None, new_since=None, changed_since=None):
+        """
+        Query the current invoices, those of the last import, as master data.
+
+        Parameters:
+            statuses (list of str, optional): Statuses of the invoices, every status if None.
+            entity (str, optional): Only this entity, "" for invoices without an entity.
+            suppliers (list of str, optional): Only these suppliers, such as the suppliers of a page.
+            new_since (int, optional): Only invoices first imported after this import.
+            changed_since (int, optional): Only invoices new or changed after this import.
+
+        Returns:
+            pd.DataFrame: Invoices in export order with the columns of the last import, dates as datetimes.
+        """
+
+        import_id = self.latest_import()
+        if import_id is None:
+            return pd.DataFrame()
+        columns, datetime_columns = (json.loads(text) for text in self.connection.execute(
+            "SELECT columns, datetime_columns FROM imports WHERE id = ?", (import_id,)).fetchone())
+
+        where, params = ["last_import = ?"], [import_id]
+        if statuses is not None:
+            where.append("status IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps(list(statuses)))
+        if entity == "":
+            where.append("entity IS NULL")
+        elif entity is not None:
+            where.append("entity = ?")
+            params.append(entity)
+        if suppliers is not None:
+            where.append("supplier IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps(list(suppliers)))
+        if new_since is not None:
+            where.append("first_import > ?")
+            params.append(new_since)
+        if changed_since is not None:
+            where.append("changed_import > ?")
+            params.append(changed_since)
+
+        query = f"SELECT data FROM invoices WHERE {' AND '.join(where)} ORDER BY position"
+        data_df = pd.DataFrame([json.loads(data) for data, in self.connection.execute(query, params)], columns=columns)
+        for column in datetime_columns:
+            if column in data_df.columns:
+                try:
+                    data_df[column] = pd.to_datetime(data_df[column], format="ISO8601")
+                except (ValueError, TypeError):
+                    pass # Dates mixed with text stay as they were imported
+        return data_df
+
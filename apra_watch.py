@@ -0,0 +1,369 @@
+# Watch-folder service of the AP Reports Automation Program: generates the reports of every SpendConsole export dropped into a folder.
+# Usage: python -m apra_watch WATCH_FOLDER --output REPORTS_FOLDER [--config Configuration.xlsx] [--jobs 2]
+#
+# File system events (inotify on Linux) are used when the optional watchdog package is installed, otherwise the folder is polled.
+# An export is only processed once it is fully written, and exports with the same content are only processed once they succeed.
+# A failed export is tried again after a growing delay, or as soon as the configuration workbook changes.
+
+import os
+import sys
+import json
+import time
+import queue
+import logging
+import zipfile
+import argparse
+import threading
+import multiprocessing
+from datetime import datetime
+try: # Optional, without it the folder is polled
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+from apra_pipeline import OUTPUT_MODES, ImportCache, file_digest
+from apra_cli import EXIT_OK, process_file
+
+
+POLL_INTERVAL = 5.0 # Seconds between checks of the files being written
+SETTLE_TIME = 10.0 # Seconds a file must stay unchanged before it is processed
+RESCAN_INTERVAL = 60.0 # Seconds between full scans when file system events are used, as network shares may not send them
+RETRY_DELAY = 60.0 # Seconds before a failed export is tried again, doubled after every failure
+MAX_RETRY_DELAY = 3600.0
+
+logger = logging.getLogger("apra_watch")
+
+
+def is_export(path):
+    """
+    Check if a path looks like a SpendConsole export, leaving out Excel lock files.
+
+    Parameters:
+        path (str): Path of the file.
+
+    Returns:
+        bool: True for .xlsx files.
+    """
+
+    name = os.path.basename(path)
+    return name.lower().endswith(".xlsx") and not name.startswith("~$")
+
+
+class ExportEventHandler(FileSystemEventHandler):
+    """
+    Passes file system events of the watched folder on to the FolderWatcher.
+    """
+
+    def __init__(self, watcher):
+        """
+        Parameters:
+            watcher (FolderWatcher): Watcher to notify.
+        """
+
+        super().__init__()
+        self.watcher = watcher
+
+
+    def on_created(self, event):
+        self.watcher.notice(event.src_path)
+
+
+    def on_modified(self, event):
+        self.watcher.notice(event.src_path)
+
+
+    def on_moved(self, event):
+        self.watcher.notice(event.dest_path)
+
+
+class FolderWatcher:
+    """
+    Watch a folder for SpendConsole exports and queue each new one to a bounded pool of worker threads.
+    Every export is processed into its own sub-folder of the output folder. The content hash of every
+    export processed successfully is kept in processed.json in the output folder, so copies and restarts are not processed twice.
+    Failed exports are not recorded there: they are tried again after RETRY_DELAY, doubled after every failure,
+    or once the configuration workbook changes, as most failures are suppliers without a page.
+    """
+
+    def __init__(self, watch_dir, output_dir, config_path="Configuration.xlsx", jobs=2, workers=None,
+                 poll_interval=POLL_INTERVAL, settle_time=SETTLE_TIME, output_mode="file"):
+        """
+        Parameters:
+            watch_dir (str): Folder the exports are dropped into.
+            output_dir (str): Folder the reports are saved in.
+            config_path (str): Path of the configuration workbook.
+            jobs (int): Number of exports processed at the same time.
+            workers (int, optional): Number of processes writing the workbooks of each export.
+            poll_interval (float): Seconds between checks of the files being written.
+            settle_time (float): Seconds a file must stay unchanged before it is processed.
+            output_mode (str): How the pages are gathered into workbooks, one of OUTPUT_MODES.
+        """
+
+        self.watch_dir = watch_dir
+        self.output_dir = output_dir
+        self.config_path = config_path
+        self.jobs = jobs
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.settle_time = settle_time
+        self.output_mode = output_mode
+
+        self.lock = threading.Lock()
+        self.queue = queue.Queue(maxsize=jobs) # A full queue leaves new exports waiting in pending
+        self.pending = {} # Path to (size and modified time, time they were first seen)
+        self.handled = {} # Path to the size and modified time it had when it was queued or skipped
+        self.active = set() # Content hashes queued or being processed
+        self.failed = {} # Path of a failed export to its content hash, failures, time of the next try and configuration signature
+        self.stop_event = threading.Event()
+        self.cache = ImportCache()
+
+        os.makedirs(output_dir, exist_ok=True)
+        self.state_path = os.path.join(output_dir, "processed.json")
+        self.processed = self.load_state()
+
+
+    def load_state(self):
+        """
+        Returns:
+            dict: Content hash to the details of every export processed so far.
+        """
+
+        try:
+            with open(self.state_path, encoding="utf-8") as f:
+                processed = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        # Earlier versions also recorded failed exports, which are tried again
+        return {digest: entry for digest, entry in processed.items() if entry.get("exit_code", EXIT_OK) == EXIT_OK}
+
+
+    def config_signature(self):
+        """
+        Returns:
+            tuple: Size and modified time of the configuration workbook, None if it cannot be read.
+        """
+
+        try:
+            stat = os.stat(self.config_path)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+
+    def save_state(self):
+        """
+        Save the processed exports, replacing the file in one step so it is never left half written.
+        """
+
+        with open(self.state_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.processed, f, indent=1)
+        os.replace(self.state_path + ".tmp", self.state_path)
+
+
+    def notice(self, path):
+        """
+        Start following a file which may be a new export, possibly still being written.
+
+        Parameters:
+            path (str): Path of the file.
+        """
+
+        if not is_export(path):
+            return
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return
+        with self.lock:
+            if self.handled.get(path) != (stat.st_size, stat.st_mtime_ns):
+                self.pending.setdefault(path, None)
+
+
+    def scan(self):
+        """
+        Notice every export in the watched folder.
+        """
+
+        for name in os.listdir(self.watch_dir):
+            self.notice(os.path.join(self.watch_dir, name))
+
+
+    def check_pending(self):
+        """
+        Queue the followed files which have stopped changing and are complete workbooks,
+        and follow again the failed exports which are due to be tried again.
+        """
+
+        now = time.monotonic()
+        config = self.config_signature()
+        with self.lock:
+            for path, (digest, failures, retry_at, failed_config) in list(self.failed.items()):
+                if now >= retry_at or config != failed_config:
+                    self.failed[path] = (digest, failures, float("inf"), config) # Not again until this try has failed
+                    self.handled.pop(path, None)
+                    self.pending.setdefault(path, None)
+                    logger.info("Trying %s again", path)
+
+            for path, seen in list(self.pending.items()):
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    del self.pending[path]
+                    self.failed.pop(path, None)
+                    continue
+
+                # Wait for the size and modified time to settle, and for the zip directory written at the very end
+                signature = (stat.st_size, stat.st_mtime_ns)
+                if seen is None or seen[0] != signature:
+                    self.pending[path] = (signature, now)
+                    continue
+                if now - seen[1] < self.settle_time or not zipfile.is_zipfile(path):
+                    continue
+
+                digest = file_digest(path)
+                if path in self.failed and self.failed[path][0] != digest:
+                    del self.failed[path] # Replaced by a new export, which starts again without delay
+                if digest in self.processed or digest in self.active:
+                    logger.info("Skipping %s, the same export was already processed", path)
+                else:
+                    try:
+                        self.queue.put_nowait((path, digest))
+                    except queue.Full:
+                        continue # Still pending, tried again on the next check
+                    self.active.add(digest)
+                    logger.info("Queued %s", path)
+
+                del self.pending[path]
+                self.handled[path] = signature
+
+
+    def work(self):
+        """
+        Worker thread: process queued exports until a None stops it.
+        """
+
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+
+            path, digest = item
+            output_dir = os.path.join(self.output_dir, os.path.splitext(os.path.basename(path))[0])
+            config = self.config_signature()
+            exit_code = process_file(path, self.config_path, output_dir, self.workers, self.cache, output_mode=self.output_mode)
+
+            with self.lock:
+                self.active.discard(digest)
+                if exit_code == EXIT_OK:
+                    self.failed.pop(path, None)
+                    self.processed[digest] = {"file": os.path.basename(path), "output": output_dir, "exit_code": exit_code,
+                                              "processed": datetime.now().isoformat(timespec="seconds")}
+                    self.save_state()
+                else:
+                    failures = self.failed[path][1] + 1 if path in self.failed else 1
+                    delay = min(RETRY_DELAY * 2 ** (failures - 1), MAX_RETRY_DELAY)
+                    self.failed[path] = (digest, failures, time.monotonic() + delay, config)
+                    logger.warning("Processing %s failed with exit code %d, trying again in %.0f seconds or once %s changes",
+                                   path, exit_code, delay, self.config_path)
+
+
+    def stop(self):
+        """
+        Ask run to stop. Exports being processed are finished first.
+        """
+
+        self.stop_event.set()
+
+
+    def run(self):
+        """
+        Watch the folder until stop is called or the program is interrupted.
+        """
+
+        threads = [threading.Thread(target=self.work, name=f"apra-watch-{i}", daemon=True) for i in range(self.jobs)]
+        for thread in threads:
+            thread.start()
+
+        observer = None
+        if Observer is not None:
+            observer = Observer()
+            observer.schedule(ExportEventHandler(self), self.watch_dir)
+            observer.start()
+            logger.info("Watching %s for file system events", self.watch_dir)
+        else:
+            logger.info("Polling %s every %g seconds", self.watch_dir, self.poll_interval)
+
+        try:
+            self.scan()
+            last_scan = time.monotonic()
+            while not self.stop_event.wait(self.poll_interval):
+                if observer is None or time.monotonic() - last_scan >= RESCAN_INTERVAL:
+                    self.scan()
+                    last_scan = time.monotonic()
+                self.check_pending()
+        finally:
+            if observer is not None:
+                observer.stop()
+                observer.join()
+            for _ in threads:
+                self.queue.put(None)
+            for thread in threads:
+                thread.join()
+
+
+def parse_args(argv=None):
+    """
+    Parse the command-line arguments.
+
+    Parameters:
+        argv (list of str, optional): Arguments without the program name, sys.argv if not given.
+
+    Returns:
+        argparse.Namespace: Parsed arguments.
+    """
+
+    parser = argparse.ArgumentParser(prog="apra_watch", description="Generate the AP reports of every SpendConsole export dropped into a folder.")
+    parser.add_argument("watch_dir", metavar="WATCH_FOLDER", help="Folder the SpendConsole exports are dropped into")
+    parser.add_argument("-o", "--output", required=True, help="Folder the reports are saved in, one sub-folder per export")
+    parser.add_argument("-c", "--config", default="Configuration.xlsx", help="Configuration workbook (default: Configuration.xlsx)")
+    parser.add_argument("-j", "--jobs", type=int, default=2, help="Number of exports processed at the same time (default: 2)")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Number of processes writing the workbooks of each export (default: number of CPUs)")
+    parser.add_argument("-m", "--mode", choices=OUTPUT_MODES, default="file", help="Workbook per page of 50 lines, per entity or per export (default: file)")
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL, help=f"Seconds between checks of the folder (default: {POLL_INTERVAL:.0f})")
+    parser.add_argument("--settle", type=float, default=SETTLE_TIME, help=f"Seconds an export must stay unchanged before it is processed (default: {SETTLE_TIME:.0f})")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Only log warnings and errors")
+
+    args = parser.parse_args(argv)
+    if args.jobs < 1 or (args.workers is not None and args.workers < 1):
+        parser.error("--jobs and --workers must be at least 1")
+    if not os.path.isdir(args.watch_dir):
+        parser.error(f"{args.watch_dir} is not a folder")
+    return args
+
+
+def run(argv=None):
+    """
+    Watch the folder given on the command line until interrupted.
+
+    Parameters:
+        argv (list of str, optional): Arguments without the program name, sys.argv if not given.
+
+    Returns:
+        int: Exit code.
+    """
+
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING if args.quiet else logging.INFO, format="%(asctime)s %(threadName)s %(levelname)s %(message)s")
+
+    watcher = FolderWatcher(args.watch_dir, args.output, args.config, args.jobs, args.workers, args.interval, args.settle, args.mode)
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        logger.info("Stopped")
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support() # Lets the worker processes of a frozen exe start
+    sys.exit(run())
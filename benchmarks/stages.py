@@ -0,0 +1,189 @@
+# Stage-level benchmark of the report pipeline on synthetic SpendConsole exports, see benchmarks/synthetic.py.
+# Usage: python -m benchmarks.stages [--rows 1000 100000 1000000] [--repeat 1] [--workers N] [--output-mode file] [--output bench_results.json]
+#
+# Every stage of main is timed on its own, so a slower stage shows up in the JSON results instead of being lost in the total.
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from apra_pipeline import (OUTPUT_MODES, RoutingIndex, read_master_data, compact_dtypes, load_highlight_rules, clean_master_data,
+                           paginate, export_all, supplier_statistics)
+from benchmarks.synthetic import make_export, write_export
+
+
+DEFAULT_ROWS = [1000, 100000, 1000000]
+STAGES = ["read", "compact", "config", "clean", "routing", "styling", "paginate", "write", "statistics"]
+
+
+class StageTimer:
+    """
+    Collects the wall time of every stage of one run.
+    """
+
+    def __init__(self):
+        self.times = {}
+
+
+    def __call__(self, stage, func, *args, **kwargs):
+        """
+        Run func, recording its wall time under stage.
+
+        Returns:
+            The result of func.
+        """
+
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        self.times[stage] = time.perf_counter() - start
+        return result
+
+
+def export_file(rows, seed, work_dir):
+    """
+    Path of the synthetic export with the given rows and seed, generated if it is not there yet.
+    Generating a million rows takes minutes, so exports are kept in work_dir for the next runs of the day.
+
+    Returns:
+        tuple: Path of the export and the seconds spent generating it (0 if reused).
+    """
+
+    file_path = os.path.join(work_dir, f"spendconsole-{rows}-{seed}-{datetime.now():%Y%m%d}.xlsx")
+    if os.path.exists(file_path):
+        return file_path, 0.0
+
+    start = time.perf_counter()
+    write_export(make_export(rows, seed), file_path + ".tmp")
+    os.replace(file_path + ".tmp", file_path)
+    return file_path, time.perf_counter() - start
+
+
+def run_once(file_path, config_path, output_dir, workers=None, output_mode="file"):
+    """
+    Run every stage of the pipeline once on an export.
+
+    Parameters:
+        file_path (str): Path of the export.
+        config_path (str): Path of the configuration workbook.
+        output_dir (str): Folder the reports are written to, emptied first.
+        workers (int, optional): Number of processes writing workbooks.
+        output_mode (str): How the sheets are gathered into workbooks, see paginate.
+
+    Returns:
+        dict: Stage timings and the sizes they were measured on.
+    """
+
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.makedirs(output_dir)
+    timer = StageTimer()
+
+    data_df = timer("read", read_master_data, file_path)
+    data_df, _, _ = timer("compact", compact_dtypes, data_df)
+    routing, highlight = timer("config", lambda: (RoutingIndex.from_frame(pd.read_excel(config_path)), load_highlight_rules(config_path)))
+    data_df = timer("clean", clean_master_data, data_df, routing)
+    pages = timer("routing", lambda: pd.Categorical(routing.route(data_df["Supplier Name"]), categories=routing.pages))
+    colours = timer("styling", highlight.colours, data_df)
+    jobs = timer("paginate", paginate, data_df, pages, colours, output_dir, output_mode=output_mode)
+    timer("write", export_all, jobs, workers)
+    timer("statistics", supplier_statistics, data_df, pages)
+
+    return {"report_rows": len(data_df), "workbooks": len(jobs), "sheets": sum(len(sheets) for _, sheets in jobs), "stages": timer.times}
+
+
+def benchmark(rows, seed, config_path, work_dir, repeat=1, workers=None, output_mode="file"):
+    """
+    Benchmark the pipeline on a synthetic export, keeping the fastest time of every stage over repeat runs.
+
+    Returns:
+        dict: Results of the export.
+    """
+
+    file_path, generate_time = export_file(rows, seed, work_dir)
+    runs = [run_once(file_path, config_path, os.path.join(work_dir, "reports"), workers, output_mode) for _ in range(repeat)]
+
+    stages = {stage: min(run["stages"][stage] for run in runs) for stage in STAGES}
+    return {
+        "rows": rows,
+        "seed": seed,
+        "export_bytes": os.path.getsize(file_path),
+        "generate_seconds": round(generate_time, 3),
+        "report_rows": runs[0]["report_rows"],
+        "output_mode": output_mode,
+        "workbooks": runs[0]["workbooks"],
+        "sheets": runs[0]["sheets"],
+        "stages": {stage: round(seconds, 4) for stage, seconds in stages.items()},
+        "total": round(sum(stages.values()), 4),
+    }
+
+
+def parse_args(argv=None):
+    """
+    Parse the command-line arguments.
+
+    Parameters:
+        argv (list of str, optional): Arguments without the program name, sys.argv if not given.
+
+    Returns:
+        argparse.Namespace: Parsed arguments.
+    """
+
+    parser = argparse.ArgumentParser(prog="benchmarks.stages", description="Time every stage of the report pipeline on synthetic exports.")
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_ROWS, help="Sizes of the exports (default: 1000 100000 1000000)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic data (default: 0)")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per size, the fastest time of every stage is kept (default: 1)")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Number of processes writing workbooks (default: number of CPUs)")
+    parser.add_argument("--output-mode", choices=OUTPUT_MODES, default="file", help="Workbook per sheet, per entity or per run (default: file)")
+    parser.add_argument("-c", "--config", default="Configuration.xlsx", help="Configuration workbook (default: Configuration.xlsx)")
+    parser.add_argument("--work-dir", default=os.path.join(tempfile.gettempdir(), "apra-bench"), help="Folder for the exports and reports")
+    parser.add_argument("-o", "--output", default="bench_results.json", help="JSON results file (default: bench_results.json)")
+
+    args = parser.parse_args(argv)
+    if args.repeat < 1 or (args.workers is not None and args.workers < 1):
+        parser.error("--repeat and --workers must be at least 1")
+    return args
+
+
+def run(argv=None):
+    """
+    Benchmark every size given on the command line and save the results as JSON.
+
+    Returns:
+        int: Exit code.
+    """
+
+    args = parse_args(argv)
+    os.makedirs(args.work_dir, exist_ok=True)
+
+    results = []
+    for rows in args.rows:
+        result = benchmark(rows, args.seed, args.config, args.work_dir, args.repeat, args.workers, args.output_mode)
+        results.append(result)
+        print(f"{rows:>9} rows  " + "  ".join(f"{stage} {seconds:.3f}s" for stage, seconds in result["stages"].items())
+              + f"  total {result['total']:.3f}s ({result['workbooks']} workbooks)")
+
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "workers": args.workers,
+        "repeat": args.repeat,
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=1)
+    print(f"Results saved in {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(run())
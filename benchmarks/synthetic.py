@@ -0,0 +1,144 @@
+# Seeded generator of SpendConsole-shaped master data, for benchmarks and trying out changes without real exports.
+# Usage: python -m benchmarks.synthetic ROWS OUTPUT.xlsx [--seed 0]
+
+import sys
+import argparse
+import numpy as np
+import pandas as pd
+import xlsxwriter
+from datetime import datetime
+
+
+# Suppliers with their own page in Configuration.xlsx, which get a large share of the invoices
+NAMED_SUPPLIERS = ["Blackwoods Pty Ltd", "NAPA Auto Parts", "LIEBHERR AUSTRALIA PTY LTD", "WesTrac Pty Ltd",
+                   "RYCO Hydraulics Pty Ltd", "Sandvik Mining & Construction Aust PTY LTD"]
+NAMED_SHARE = 0.3
+
+ENTITIES = {"MAC": 0.5, "TMM": 0.25, "MCS": 0.15, "MCP": 0.06, None: 0.04} # None is a blank entity
+STATUSES = {"Pending": 0.45, "Approved": 0.3, "Rejected": 0.1, "Paid": 0.15}
+CREDIT_MEMO_SHARE = 0.05
+SUPPLIER_COUNT = 2000
+MAX_AGE_DAYS = 90
+COMMENTS = ["check with site regarding delivery docket and quantities", "price variance to PO", "awaiting GR", "ok"]
+
+SYLLABLES = ["al", "bar", "con", "del", "en", "fer", "gra", "hol", "in", "jet", "kor", "lan", "mar", "nor", "or",
+             "pel", "quin", "ros", "sta", "tor", "ul", "ven", "wes", "xan", "yar", "zen"]
+SUFFIXES = ["Pty Ltd", "PTY LTD", "Ltd", "Services", "Engineering", "Supplies", "Group", "& Co", "Hire", "Transport"]
+
+
+def supplier_names(rng, count=SUPPLIER_COUNT):
+    """
+    Make up supplier names, spread over every first letter.
+
+    Parameters:
+        rng (np.random.Generator): Random number generator.
+        count (int): Number of names.
+
+    Returns:
+        list of str: Unique supplier names.
+    """
+
+    names = set()
+    while len(names) < count:
+        word = "".join(rng.choice(SYLLABLES, rng.integers(2, 4))).capitalize()
+        names.add(f"{word} {rng.choice(SUFFIXES)}")
+    return sorted(names)
+
+
+def weighted_choice(rng, weights, size):
+    """
+    Draw size values from a dict of value to probability.
+    """
+
+    values = list(weights)
+    index = rng.choice(len(values), size, p=np.array(list(weights.values())) / sum(weights.values()))
+    return np.array(values, dtype=object)[index]
+
+
+def make_export(rows, seed=0, today=None):
+    """
+    Generate SpendConsole-shaped master data.
+
+    A few suppliers get most of the invoices (Zipf-like), and the suppliers with their own page in
+    Configuration.xlsx get NAMED_SHARE of them. Every supplier can be routed by the configuration.
+
+    Parameters:
+        rows (int): Number of invoice lines.
+        seed (int): Seed of the random number generator, the same seed gives the same data.
+        today (datetime, optional): Latest invoice date, today if not given.
+
+    Returns:
+        pd.DataFrame: Master data with the columns of a SpendConsole export.
+    """
+
+    rng = np.random.default_rng(seed)
+    today = (today or datetime.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    suppliers = np.array(list(rng.permutation(supplier_names(rng))) + NAMED_SUPPLIERS, dtype=object) # Shuffled, so the busiest suppliers are not all early in the alphabet
+    weights = 1 / np.arange(1, SUPPLIER_COUNT + 1) ** 1.1
+    weights = np.concatenate([weights / weights.sum() * (1 - NAMED_SHARE), np.full(len(NAMED_SUPPLIERS), NAMED_SHARE / len(NAMED_SUPPLIERS))])
+    supplier = suppliers[rng.choice(len(suppliers), rows, p=weights)]
+
+    invoice_date = today - pd.to_timedelta(rng.integers(0, MAX_AGE_DAYS, rows), unit="D")
+    received_date = invoice_date + pd.to_timedelta(rng.integers(0, 15, rows), unit="D")
+    credit_memo = rng.random(rows) < CREDIT_MEMO_SHARE
+    sub_total = np.round(rng.lognormal(6, 1.5, rows), 2)
+    tax = np.round(sub_total * 0.1, 2)
+    comments = np.where(rng.random(rows) < 0.1, np.array(COMMENTS, dtype=object)[rng.integers(0, len(COMMENTS), rows)], None)
+
+    return pd.DataFrame({
+        "SC_Invoice_UniqueId": np.arange(rows) + 100000,
+        "Entity": weighted_choice(rng, ENTITIES, rows),
+        "Supplier Name": supplier,
+        "Invoice Number": [f"INV{n:08d}" for n in rng.integers(0, 10 ** 8, rows)],
+        "PO #": rng.integers(4500000000, 4500100000, rows),
+        "Invoice Date": invoice_date,
+        "ReceivedDate": received_date,
+        "Status": weighted_choice(rng, STATUSES, rows),
+        "IsCreditMemo": credit_memo,
+        "SubTotal": sub_total,
+        "Tax": tax,
+        "Total": np.round(sub_total + tax, 2),
+        "Comments": comments,
+    })
+
+
+def write_export(data_df, file_path):
+    """
+    Save master data as an .xlsx export, streamed row by row so a million rows fit in memory.
+
+    Parameters:
+        data_df (pd.DataFrame): Master data, see make_export.
+        file_path (str): Path of the workbook.
+    """
+
+    workbook = xlsxwriter.Workbook(file_path, {"constant_memory": True})
+    worksheet = workbook.add_worksheet("Sheet1")
+    date_format = workbook.add_format({"num_format": "dd/mm/yyyy"})
+    worksheet.write_row(0, 0, data_df.columns)
+
+    columns = []
+    for name in data_df.columns:
+        column = data_df[name]
+        if pd.api.types.is_datetime64_any_dtype(column):
+            columns.append((column.dt.to_pydatetime(), date_format))
+        else:
+            columns.append((column.astype(object).where(column.notna(), None).to_numpy(), None))
+
+    for row in range(len(data_df)):
+        for col, (values, cell_format) in enumerate(columns):
+            value = values[row]
+            if value is not None:
+                worksheet.write(row + 1, col, value, cell_format)
+    workbook.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="benchmarks.synthetic", description="Generate a SpendConsole-shaped export.")
+    parser.add_argument("rows", type=int, help="Number of invoice lines")
+    parser.add_argument("output", help="Path of the .xlsx export")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the random number generator (default: 0)")
+    args = parser.parse_args()
+
+    write_export(make_export(args.rows, args.seed), args.output)
+    sys.exit(0)
@@ -0,0 +1,19 @@
+import pandas as pd
+from apra_pipeline import read_master_data
+from benchmarks.synthetic import make_export, write_export
+
+
+def test_na_text_is_read_as_blank_like_read_excel(tmp_path):
+    data_df = make_export(20)
+    data_df.loc[0, "Comments"] = "N/A"
+    data_df.loc[1, "Comments"] = "NULL"
+    data_df.loc[2, "Comments"] = "n/a " # Not an NA string with the space
+    data_df.loc[3, "Entity"] = "NA"
+    export_path = str(tmp_path / "export.xlsx")
+    write_export(data_df, export_path)
+
+    read = read_master_data(export_path, statuses=None, drop_columns=())
+    expected = pd.read_excel(export_path)
+    for col in ["Comments", "Entity"]:
+        assert list(read[col].isna()) == list(expected[col].isna())
+    assert read.loc[2, "Comments"] == "n/a "
@@ -0,0 +1,36 @@
+import os
+import string
+import pandas as pd
+from apra_pipeline import RoutingIndex, excel_to_dict
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Configuration.xlsx")
+
+
+def legacy_page(supplier, supp_list, discriminant_list, special_list):
+    """
+    Page of a supplier as the routing loop of main worked it out before RoutingIndex.
+    """
+
+    if supplier in special_list:
+        return supp_list[discriminant_list.index([supplier])]
+    ind = 0
+    while True:
+        if supplier[0].upper() in discriminant_list[ind]:
+            return supp_list[ind]
+        ind += 1
+
+
+def test_routing_matches_the_legacy_loop():
+    supp_df = pd.read_excel(CONFIG_PATH)
+    supp_list, discriminant_list, special_list = excel_to_dict(supp_df)
+
+    suppliers = list(special_list)
+    suppliers += [f"{name} Other" for name in special_list] # Same first letter as a special supplier, but not one
+    suppliers += [name.lower() for name in special_list]
+    suppliers += [f"{letter}{suffix}" for letter in string.ascii_uppercase for suffix in [" Supplies", "x"]]
+    suppliers += [f"{letter.lower()} supplies" for letter in string.ascii_uppercase]
+
+    routing = RoutingIndex.from_frame(supp_df)
+    expected = [legacy_page(supplier, supp_list, discriminant_list, special_list) for supplier in suppliers]
+    assert list(routing.route(pd.Series(suppliers))) == expected
+    assert list(routing.route(pd.Series(suppliers, dtype="category"))) == expected
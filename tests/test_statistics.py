@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+from apra_pipeline import compact_dtypes, clean_master_data, supplier_statistics
+from benchmarks.synthetic import make_export
+
+
+def test_summary_totals_add_up_to_the_cent():
+    rng = np.random.default_rng(0)
+    cents = rng.integers(1000000, 9999999, size=20000, endpoint=True) # Amounts between 10,000.00 and 99,999.99
+    data_df = pd.DataFrame({
+        "Entity": rng.choice(["MAC", "MCS", "TMM"], size=len(cents)),
+        "Supplier Name": "Acme Supplies",
+        "Invoice Date": pd.Timestamp("2023-08-01"),
+        "IsCreditMemo": False,
+        "SubTotal": cents / 100,
+        "Tax": cents / 100,
+        "Total": cents / 100,
+    })
+
+    data_df, _, _ = compact_dtypes(data_df)
+    summary_df = supplier_statistics(data_df, pd.Categorical(["A to C"] * len(data_df)))
+
+    total = summary_df.iloc[-1]
+    assert total["Entity"] == "Total"
+    for col in ["SubTotal", "Tax", "Total"]:
+        assert round(total[col] * 100) == cents.sum()
+
+
+def test_blank_credit_memo_cells_are_not_credit_memos():
+    data_df = make_export(10)
+    data_df["Status"] = "Approved"
+    data_df["IsCreditMemo"] = [True, False, None] * 3 + [True]
+    amounts = data_df["Total"].copy()
+
+    data_df, _, _ = compact_dtypes(data_df)
+    data_df = clean_master_data(data_df)
+
+    credit = [True, False, False] * 3 + [True]
+    assert list(data_df["Total"]) == [-amount if is_credit else amount for amount, is_credit in zip(amounts, credit)]
+    summary_df = supplier_statistics(data_df, pd.Categorical(["A to C"] * len(data_df)))
+    assert summary_df.iloc[-1]["Credit Memo Lines"] == 4
@@ -0,0 +1,78 @@
+import numpy as np
+from apra_pipeline import read_master_data
+from apra_store import InvoiceStore
+from benchmarks.synthetic import make_export, write_export
+
+
+def two_line_export(rows, seed=0):
+    """
+    Synthetic export where every invoice has two lines.
+    """
+
+    data_df = make_export(rows, seed)
+    data_df["SC_Invoice_UniqueId"] = np.arange(rows) // 2 + 100000
+    return data_df
+
+
+def test_store_keeps_every_line_of_an_invoice(tmp_path):
+    export_path = str(tmp_path / "export.xlsx")
+    write_export(two_line_export(200), export_path)
+
+    with InvoiceStore(str(tmp_path / "store.sqlite3")) as store:
+        store.import_file(export_path)
+        stored = store.frame(statuses=None)
+
+    read = read_master_data(export_path, statuses=None, drop_columns=())
+    assert len(stored) == len(read) == 200
+    assert list(stored["SubTotal"]) == list(read["SubTotal"])
+
+
+def test_reimport_replaces_all_lines_of_an_invoice(tmp_path):
+    data_df = two_line_export(200)
+    first_path, second_path = str(tmp_path / "first.xlsx"), str(tmp_path / "second.xlsx")
+    write_export(data_df, first_path)
+    # The first invoice now has a single line and the second one a changed line
+    second_df = data_df.drop(index=1).reset_index(drop=True)
+    second_df.loc[2, "SubTotal"] += 5
+    write_export(second_df, second_path)
+
+    with InvoiceStore(str(tmp_path / "store.sqlite3")) as store:
+        first_import, _ = store.import_file(first_path)
+        store.import_file(second_path)
+        stored = store.frame(statuses=None)
+        changed = store.frame(statuses=None, changed_since=first_import)
+
+    assert len(stored) == 199
+    assert (stored["SC_Invoice_UniqueId"] == 100000).sum() == 1
+    assert list(changed["SubTotal"]) == [second_df.loc[2, "SubTotal"]]
+
+
+def test_import_of_several_exports_takes_every_line_from_the_last(tmp_path):
+    data_df = two_line_export(20)
+    first_path, second_path = str(tmp_path / "first.xlsx"), str(tmp_path / "second.xlsx")
+    write_export(data_df, first_path)
+    # The newer export has three lines of the first invoice
+    write_export(data_df.iloc[[0, 0, 1]].reset_index(drop=True), second_path)
+
+    with InvoiceStore(str(tmp_path / "store.sqlite3")) as store:
+        store.import_file([first_path, second_path])
+        stored = store.frame(statuses=None)
+
+    assert len(stored) == 21
+    assert (stored["SC_Invoice_UniqueId"] == 100000).sum() == 3
+
+
+def test_frame_of_one_entity_and_its_suppliers(tmp_path):
+    data_df = make_export(200)
+    export_path = str(tmp_path / "export.xlsx")
+    write_export(data_df, export_path)
+    entity = data_df["Entity"].iloc[0]
+    suppliers = list(data_df.loc[data_df["Entity"] == entity, "Supplier Name"].unique()[:2])
+
+    with InvoiceStore(str(tmp_path / "store.sqlite3")) as store:
+        store.import_file(export_path)
+        stored = store.frame(statuses=None, entity=entity, suppliers=suppliers)
+
+    expected = data_df[(data_df["Entity"] == entity) & data_df["Supplier Name"].isin(suppliers)]
+    assert len(stored) == len(expected) > 0
+    assert list(stored["SC_Invoice_UniqueId"]) == list(expected["SC_Invoice_UniqueId"])